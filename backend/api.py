@@ -3,17 +3,30 @@ FastAPI Backend for Lead Scoring & Prioritization Agent
 Handles API requests and communicates with Gemini LLM
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
 from typing import List, Optional
 from datetime import datetime
 import uvicorn
 import asyncio
+import orjson
+import os
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-from core_scoring import initialize_gemini, score_single_lead, get_priority_label
-from chat_agent import chat_with_leads, get_suggested_questions
+from core_scoring import (
+    initialize_gemini, score_single_lead, get_priority_label, get_score_cache_stats,
+    canonicalize_lead_text
+)
+from chat_agent import (
+    chat_with_leads, chat_with_leads_stream, chat_cache_key,
+    get_cached_chat_answer, lookup_chat_answer, get_suggested_questions
+)
+from rate_limiter import TokenBucket
 
 # =============================================================================
 # FASTAPI APP INITIALIZATION
@@ -22,7 +35,8 @@ from chat_agent import chat_with_leads, get_suggested_questions
 app = FastAPI(
     title="Lead Scoring API",
     description="AI-powered lead scoring using Google Gemini API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Enable CORS for frontend access
@@ -34,24 +48,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (batch results, chat answers) for clients that accept gzip;
+# level 4 keeps most of the size win at a fraction of level 9's CPU cost
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=4)
+
+# =============================================================================
+# GEMINI RATE LIMITS
+# =============================================================================
+
+# Provider quotas (requests and tokens per minute) and typical call latency in seconds
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", "1000"))
+GEMINI_TPM = int(os.environ.get("GEMINI_TPM", "1000000"))
+GEMINI_AVG_LATENCY_S = float(os.environ.get("GEMINI_AVG_LATENCY_S", "1.5"))
+
+# Server worker processes (same variable uvicorn and gunicorn read). Each worker
+# has its own event loop, semaphore and token bucket, so the quota is split evenly
+API_WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+WORKER_RPM = max(1, GEMINI_RPM // API_WORKERS)
+WORKER_TPM = max(1, GEMINI_TPM // API_WORKERS)
+
+# Calls in flight needed to use this worker's quota without exceeding it
+# (requests per second x seconds per request)
+LLM_CONCURRENCY = max(1, int(WORKER_RPM / 60 * GEMINI_AVG_LATENCY_S))
+
+# Leads scored per task in /score/batch. NLP scoring takes microseconds, so
+# scheduling one asyncio task per lead would cost as much as the scoring itself
+SCORING_CHUNK_SIZE = 100
+
+# Starts the error message when /chat/stream fails after part of the answer
+# was sent (the status code is already 200 by then). ASCII record separator,
+# so it can't clash with answer text
+CHAT_STREAM_ERROR_MARKER = "\x1e"
+
 model = None
+llm_semaphore = None  # Shared across requests, created at startup
+llm_rate_limiter = None  # Shared across requests, created at startup
+wait_for_llm_quota = None  # Blocking llm_rate_limiter gate for executor threads, created at startup
+llm_executor = None  # Threads for blocking Gemini SDK calls, created at startup
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize Gemini model when API starts."""
-    global model
+    global model, llm_semaphore, llm_rate_limiter, wait_for_llm_quota, llm_executor
+    llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    # One thread per semaphore slot, so the semaphore (not the default
+    # executor's min(32, cpu_count + 4) threads) limits in-flight calls
+    llm_executor = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="gemini")
+    llm_rate_limiter = TokenBucket(rpm=WORKER_RPM, tpm=WORKER_TPM)
+    # Chat runs in the executor and takes a token before every Gemini call it
+    # makes (retries and the conversion fallback included)
+    wait_for_llm_quota = partial(llm_rate_limiter.acquire_threadsafe, asyncio.get_running_loop())
     try:
         model = initialize_gemini()
         print("=" * 70)
         print("BACKEND API SERVER STARTED")
         print("=" * 70)
         print("✅ Gemini API initialized successfully")
+        print(f"⚙️  LLM concurrency: {LLM_CONCURRENCY} (GEMINI_RPM={GEMINI_RPM}, workers={API_WORKERS})")
         print("🔗 Backend ready to receive requests from frontend")
         print("=" * 70)
     except Exception as e:
         print(f"❌ Failed to initialize Gemini API: {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release the Gemini worker threads when API stops."""
+    if llm_executor is not None:
+        llm_executor.shutdown(wait=False)
+
+
 # =============================================================================
 # PYDANTIC MODELS (REQUEST/RESPONSE SCHEMAS)
 # =============================================================================
@@ -62,14 +128,16 @@ class LeadInput(BaseModel):
     company_size: str = Field(..., description="Company size range (e.g., '50-200', '1000+')")
     message: str = Field(..., description="Lead's message or inquiry")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        extra="ignore",
+        json_schema_extra={
             "example": {
                 "role": "CTO",
                 "company_size": "500-1000",
                 "message": "We have an urgent migration deadline approaching. Need enterprise plan for 300+ users."
             }
         }
+    )
 
 
 class LeadBatchInput(BaseModel):
@@ -93,6 +161,19 @@ class LeadBatchScore(BaseModel):
     total: int
     successful: int
     failed: int
+    deduped: int = 0  # Leads answered from an identical lead earlier in the batch
+
+
+class CacheStats(BaseModel):
+    """Schema for score cache statistics."""
+    hits: int
+    misses: int
+    size: int
+    max_size: int
+
+
+# Built once at import; /score/batch validates the raw request body with it
+LEAD_BATCH_ADAPTER = TypeAdapter(LeadBatchInput)
 
 
 class HealthCheck(BaseModel):
@@ -118,6 +199,8 @@ async def root():
             "/health": "Health check",
             "/score": "Score a single lead (POST)",
             "/score/batch": "Score multiple leads (POST)",
+            "/score/batch/stream": "Score multiple leads, streamed as NDJSON (POST)",
+            "/cache/stats": "Score cache statistics",
             "/docs": "Interactive API documentation"
         }
     }
@@ -133,6 +216,12 @@ async def health_check():
     }
 
 
+@app.get("/cache/stats", response_model=CacheStats)
+async def cache_stats():
+    """Score cache statistics (hits, misses, current and maximum size)."""
+    return get_score_cache_stats()
+
+
 @app.post("/score", response_model=LeadScore)
 async def score_lead(lead: LeadInput):
     """
@@ -177,64 +266,97 @@ async def score_lead(lead: LeadInput):
         )
 
 
-async def process_single_lead_async(lead: LeadInput, semaphore: asyncio.Semaphore):
+def lead_error_result(error, timestamp: Optional[str] = None) -> dict:
+    """Build the LeadScore payload for a lead that could not be scored."""
+    return {
+        "score": 0,
+        "justification": "Error processing.",
+        "priority_label": "🚫 Junk/Error",
+        "success": False,
+        "error": str(error),
+        "timestamp": timestamp or datetime.now().isoformat()
+    }
+
+
+async def process_single_lead_async(lead: LeadInput, timestamp: Optional[str] = None):
     """
-    Process a single lead with concurrency control.
+    Process a single lead for the batch endpoint.
+    
+    Scoring is in-process NLP (no LLM round trip), so it runs directly on
+    the event loop instead of being offloaded to a thread per lead.
     
     Args:
         lead: LeadInput object
-        semaphore: Asyncio semaphore to limit concurrent workers
+        timestamp: Shared ISO timestamp for the whole batch (defaults to now)
         
     Returns:
         dict: Lead score result
     """
-    async with semaphore:
-        try:
-            # Run the synchronous scoring function in a thread pool
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                score_single_lead,
-                model,
-                lead.role,
-                lead.company_size,
-                lead.message
-            )
-            
-            lead_score = {
-                "score": result["score"],
-                "justification": result["justification"],
-                "priority_label": get_priority_label(result["score"]),
-                "success": result["success"],
-                "error": result.get("error"),
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            return lead_score
-            
-        except Exception as e:
-            return {
-                "score": 0,
-                "justification": "Error processing.",
-                "priority_label": "🚫 Junk/Error",
-                "success": False,
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+    timestamp = timestamp or datetime.now().isoformat()
+    try:
+        result = score_single_lead(
+            model,
+            lead.role,
+            lead.company_size,
+            lead.message
+        )
+        
+        lead_score = {
+            "score": result["score"],
+            "justification": result["justification"],
+            "priority_label": get_priority_label(result["score"]),
+            "success": result["success"],
+            "error": result.get("error"),
+            "timestamp": timestamp
+        }
+        
+        return lead_score
+        
+    except Exception as e:
+        return lead_error_result(e, timestamp)
 
 
-@app.post("/score/batch", response_model=LeadBatchScore)
-async def score_leads_batch(batch: LeadBatchInput):
+async def process_lead_chunk_async(leads: List[LeadInput], timestamp: str):
     """
-    Score multiple leads in batch with 10 concurrent workers.
+    Process a chunk of leads in a single coroutine.
     
-    Flow: Frontend → This endpoint → 10 Parallel Workers → Response
+    Args:
+        leads: Consecutive LeadInput objects from one batch
+        timestamp: Shared ISO timestamp for the whole batch
+        
+    Returns:
+        list: Lead score results, in input order
+    """
+    return [await process_single_lead_async(lead, timestamp) for lead in leads]
+
+
+@app.post(
+    "/score/batch",
+    response_model=LeadBatchScore,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": {"$ref": "#/components/schemas/LeadBatchInput"}}
+            }
+        }
+    }
+)
+async def score_leads_batch(request: Request):
+    """
+    Score multiple leads in batch.
+    
+    Flow: Frontend → This endpoint → NLP Scorer (per lead) → Response
+    
+    The body is validated straight from JSON bytes with LEAD_BATCH_ADAPTER and
+    the response is serialized once with model_dump_json, skipping FastAPI's
+    per-field validation and dict re-serialization for large batches.
     
     Args:
-        batch: LeadBatchInput object with list of leads
+        request: Raw request whose body is a LeadBatchInput JSON object
         
     Returns:
-        LeadBatchScore object with results for all leads
+        LeadBatchScore JSON with results for all leads
     """
     if model is None:
         raise HTTPException(
@@ -242,23 +364,91 @@ async def score_leads_batch(batch: LeadBatchInput):
             detail="Gemini API not initialized. Please check your GEMINI_API_KEY."
         )
     
-    # Create a semaphore to limit concurrent workers to 10
-    semaphore = asyncio.Semaphore(10)
+    try:
+        batch = LEAD_BATCH_ADAPTER.validate_json(await request.body())
+    except ValidationError as e:
+        # Same 422 shape FastAPI produces for a validated body parameter
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
+    
+    # Duplicate rows (same lead after canonicalization) are scored only once
+    lead_keys = [
+        (canonicalize_lead_text(lead.role), lead.company_size, canonicalize_lead_text(lead.message))
+        for lead in batch.leads
+    ]
+    unique_leads = {}
+    for key, lead in zip(lead_keys, batch.leads):
+        unique_leads.setdefault(key, lead)
+    unique_keys = list(unique_leads)
+    unique_list = list(unique_leads.values())
     
-    # Process all leads concurrently with 10 workers
-    tasks = [process_single_lead_async(lead, semaphore) for lead in batch.leads]
-    results = await asyncio.gather(*tasks)
+    # Score leads in chunks: one task per chunk instead of one per lead
+    chunks = [
+        unique_list[i:i + SCORING_CHUNK_SIZE]
+        for i in range(0, len(unique_list), SCORING_CHUNK_SIZE)
+    ]
+    # One timestamp for the whole batch instead of one clock read per lead
+    timestamp = datetime.now().isoformat()
+    tasks = [process_lead_chunk_async(chunk, timestamp) for chunk in chunks]
+    chunk_results = await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # A chunk that raised still gets error entries instead of failing the whole batch
+    unique_results = []
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        if isinstance(chunk_result, BaseException):
+            unique_results.extend(lead_error_result(chunk_result, timestamp) for _ in chunk)
+        else:
+            unique_results.extend(chunk_result)
+    
+    # Fan results back out to every input position
+    result_by_key = dict(zip(unique_keys, unique_results))
+    results = [result_by_key[key] for key in lead_keys]
     
     # Count successful and failed
     successful = sum(1 for r in results if r["success"])
     failed = len(results) - successful
     
-    return {
-        "results": results,
-        "total": len(batch.leads),
-        "successful": successful,
-        "failed": failed
-    }
+    batch_score = LeadBatchScore(
+        results=results,
+        total=len(batch.leads),
+        successful=successful,
+        failed=failed,
+        deduped=len(lead_keys) - len(unique_keys)
+    )
+    return Response(content=batch_score.model_dump_json(), media_type="application/json")
+
+
+@app.post("/score/batch/stream")
+async def score_leads_batch_stream(batch: LeadBatchInput):
+    """
+    Score multiple leads and stream each result as soon as it is ready.
+    
+    Flow: Frontend → This endpoint → NLP Scorer (per lead) → NDJSON stream
+    
+    Each line is a JSON object: LeadScore fields plus "index", the lead's
+    position in the request. Leads are scored and sent in order, so the
+    client can render results while the rest of the batch is still scoring.
+    
+    Args:
+        batch: LeadBatchInput object with list of leads
+        
+    Returns:
+        StreamingResponse with media type application/x-ndjson
+    """
+    if model is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Gemini API not initialized. Please check your GEMINI_API_KEY."
+        )
+    
+    async def result_lines():
+        for index, lead in enumerate(batch.leads):
+            result = await process_single_lead_async(lead)
+            yield orjson.dumps({"index": index, **result}) + b"\n"
+    
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
 
 
 # =============================================================================
@@ -270,8 +460,8 @@ class ChatQuery(BaseModel):
     query: str = Field(..., description="User's question about the lead data")
     leads_data: List[dict] = Field(..., description="List of scored leads")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "query": "Who are the top 5 leads?",
                 "leads_data": [
@@ -286,6 +476,7 @@ class ChatQuery(BaseModel):
                 ]
             }
         }
+    )
 
 
 class ChatResponse(BaseModel):
@@ -297,6 +488,46 @@ class ChatResponse(BaseModel):
     timestamp: str
 
 
+# In-flight Gemini chat calls by chat cache key, for coalescing duplicates
+chat_inflight = {}
+
+
+async def run_chat_call(query: str, leads_data: list, cache_key: tuple) -> dict:
+    """
+    Run one rate-limited chat_with_leads call in the LLM executor.
+    
+    Args:
+        query: User's question
+        leads_data: List of scored leads
+        cache_key: chat_cache_key(query, leads_data)
+        
+    Returns:
+        dict: chat_with_leads result
+    """
+    loop = asyncio.get_event_loop()
+    
+    # Probe the answer caches (including the semantic cache's embedding) before
+    # taking an LLM slot, so a hit spends no quota
+    cached, embedding = await loop.run_in_executor(
+        llm_executor, lookup_chat_answer, query, leads_data, cache_key
+    )
+    if cached is not None:
+        return cached
+    
+    # Rate-limit tokens are taken per Gemini call, sized from the actual prompt
+    async with llm_semaphore:
+        return await loop.run_in_executor(
+            llm_executor,
+            chat_with_leads,
+            model,
+            query,
+            leads_data,
+            cache_key,
+            embedding,
+            wait_for_llm_quota
+        )
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_about_leads(chat_query: ChatQuery):
     """
@@ -304,6 +535,12 @@ async def chat_about_leads(chat_query: ChatQuery):
     
     Flow: Frontend → This endpoint → Gemini LLM (with data context) → Response
     
+    Gemini calls run in a worker thread so they don't block the event loop,
+    gated by a process-wide semaphore sized from the RPM quota. Each call
+    (retry or conversion fallback included) also takes its estimated tokens
+    from the RPM/TPM token bucket. Cached answers (exact or semantic) skip both.
+    Concurrent identical questions share one call.
+    
     Args:
         chat_query: ChatQuery with user question and lead data
         
@@ -317,11 +554,21 @@ async def chat_about_leads(chat_query: ChatQuery):
         )
     
     try:
-        result = chat_with_leads(
-            model=model,
-            query=chat_query.query,
-            leads_data=chat_query.leads_data
-        )
+        # A repeated question about the same leads skips the rate limiter and Gemini
+        cache_key = chat_cache_key(chat_query.query, chat_query.leads_data)
+        result = get_cached_chat_answer(cache_key)
+        
+        if result is None:
+            # Identical questions arriving while one is in flight share its Gemini call
+            task = chat_inflight.get(cache_key)
+            if task is None:
+                task = asyncio.ensure_future(
+                    run_chat_call(chat_query.query, chat_query.leads_data, cache_key)
+                )
+                chat_inflight[cache_key] = task
+                task.add_done_callback(lambda _: chat_inflight.pop(cache_key, None))
+            # Shielded so one client disconnecting doesn't cancel the call for the others
+            result = dict(await asyncio.shield(task))
         
         return {
             "answer": result["answer"],
@@ -338,6 +585,145 @@ async def chat_about_leads(chat_query: ChatQuery):
         )
 
 
+def next_answer_chunk(chunks) -> tuple:
+    """
+    Read the next chunk of a chat_with_leads_stream generator (blocking).
+    
+    Args:
+        chunks: chat_with_leads_stream generator
+        
+    Returns:
+        tuple: (text chunk, None), or (None, final chat result) once the stream ends
+    """
+    try:
+        return next(chunks), None
+    except StopIteration as stop:
+        return None, stop.value
+
+
+async def read_chat_stream(chunks, queue: asyncio.Queue) -> dict:
+    """
+    Read a chat_with_leads_stream generator into a queue while holding an LLM slot.
+    
+    Runs as its own task, so the slot is released as soon as Gemini finishes
+    however slowly the client reads. Puts None on the queue when it stops. If
+    cancelled, the generator is closed once its pending read has returned.
+    
+    Args:
+        chunks: chat_with_leads_stream generator
+        queue: Receives the text chunks, then None
+        
+    Returns:
+        dict: Final chat result
+    """
+    read = None
+    try:
+        async with llm_semaphore:
+            while True:
+                read = llm_executor.submit(next_answer_chunk, chunks)
+                chunk, result = await asyncio.wrap_future(read)
+                if chunk is None:
+                    return result
+                queue.put_nowait(chunk)
+    finally:
+        queue.put_nowait(None)
+        # A read still running in its thread owns the generator; close it after
+        if read is None:
+            chunks.close()
+        else:
+            read.add_done_callback(lambda _: chunks.close())
+
+
+@app.post("/chat/stream")
+async def chat_about_leads_stream(chat_query: ChatQuery):
+    """
+    Chat with AI about lead data, streaming the answer as it is generated.
+    
+    Flow: Frontend → This endpoint → Gemini LLM (stream=True) → text chunks
+    
+    Same rate limiting as /chat. The blocking Gemini stream is read chunk by
+    chunk in the LLM executor by read_chat_stream, holding one semaphore slot
+    until Gemini is done (not until the client has read everything). A client
+    that disconnects stops the read and closes the Gemini stream.
+    
+    If Gemini fails before any text is produced, the response is a 429 (rate
+    limit) or 502 with the error message as detail. If it fails mid-answer,
+    the stream ends with CHAT_STREAM_ERROR_MARKER followed by the message.
+    
+    Args:
+        chat_query: ChatQuery with user question and lead data
+        
+    Returns:
+        StreamingResponse of plain text answer chunks
+    """
+    if model is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Gemini API not initialized. Please check your GEMINI_API_KEY."
+        )
+    
+    cache_key = chat_cache_key(chat_query.query, chat_query.leads_data)
+    
+    async def answer_chunks():
+        """Yield answer text, or the failed chat result if nothing was sent yet."""
+        loop = asyncio.get_event_loop()
+        
+        # Cache hits (exact or semantic) are answered without spending quota
+        cached, embedding = await loop.run_in_executor(
+            llm_executor, lookup_chat_answer, chat_query.query, chat_query.leads_data, cache_key
+        )
+        if cached is not None:
+            yield cached["answer"]
+            return
+        
+        chunks = chat_with_leads_stream(
+            model, chat_query.query, chat_query.leads_data, cache_key, embedding,
+            wait_for_llm_quota
+        )
+        queue = asyncio.Queue()
+        reader = asyncio.ensure_future(read_chat_stream(chunks, queue))
+        try:
+            sent_text = False
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                sent_text = True
+                yield chunk
+            result = await reader
+        finally:
+            # No-op once the read is done; stops Gemini if the client went away
+            reader.cancel()
+        
+        if not result["success"]:
+            yield CHAT_STREAM_ERROR_MARKER + result["answer"] if sent_text else result
+    
+    # Read up to the first chunk before answering, so a call that fails
+    # outright gets an error status instead of a 200 with the error as text
+    chunks = answer_chunks()
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    
+    if isinstance(first, dict):
+        await chunks.aclose()
+        raise HTTPException(
+            status_code=429 if "429" in first["error"] else 502,
+            detail=first["answer"]
+        )
+    
+    async def response_chunks():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+    
+    return StreamingResponse(response_chunks(), media_type="text/plain; charset=utf-8")
+
+
 @app.post("/chat/suggestions")
 async def get_chat_suggestions(leads_data: List[dict]):
     """
@@ -378,10 +764,16 @@ if __name__ == "__main__":
     print("🔗 Backend will handle requests from frontend")
     print()
     
+    # API_RELOAD=true for local development (uvicorn then runs a single process)
+    reload = os.environ.get("API_RELOAD", "false").lower() == "true"
+    
+    # For production, run under gunicorn instead:
+    #   WEB_CONCURRENCY=9 gunicorn api:app -k uvicorn.workers.UvicornWorker
     uvicorn.run(
         "api:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        workers=API_WORKERS,
+        reload=reload,
         log_level="info"
     )
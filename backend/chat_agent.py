@@ -3,36 +3,144 @@ Chat Agent for Lead Data Analysis
 Uses LLM to answer questions about scored leads
 """
 
+import hashlib
 import json
+import math
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator
+import numpy as np
+import orjson
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from semantic_cache import SemanticCache
+
+# Transient Gemini failures worth retrying (overload, timeouts); anything else
+# fails fast. 429 ResourceExhausted is not retried here: the token bucket
+# already paces calls, and backing off in the worker thread would hold an LLM
+# slot while sleeping
+RETRYABLE_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+# Structured-output tells in LLM answers, compiled once
+NEEDS_CONVERSION_RE = re.compile(
+    r'"[^"]+"\s*,\s*"[^"]+"\s*,\s*"[^"]+"|"(?:summary|response|answer|message)":',
+    re.IGNORECASE
+)
+QUOTED_PAIR_RE = re.compile(r'"[^"]+"\s*,\s*"[^"]+"')
+QUOTED_VALUE_RE = re.compile(r'"([^"]+)"')
+JSON_TEXT_FIELD_RE = re.compile(r'"(?:summary|response|answer|message)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+MAX_LLM_ATTEMPTS = 4
+RETRY_BASE_DELAY_S = 1.0
+RETRY_MAX_DELAY_S = 8.0
+
+
+def estimate_call_tokens(prompt: str, generation_config) -> int:
+    """Cheap token estimate for one call: ~4 prompt characters per token plus the output cap."""
+    return len(prompt) // 4 + (generation_config.max_output_tokens or 0)
+
+
+def generate_with_retry(model, prompt: str, generation_config, rate_limit=None, **kwargs):
+    """
+    Call model.generate_content, retrying transient errors with exponential backoff + jitter.
+    
+    With stream=True only the initial request is retried; errors raised while
+    iterating the chunks reach the caller.
+    
+    Args:
+        model: Initialized Gemini model
+        prompt: Prompt text
+        generation_config: GenerationConfig for this call
+        rate_limit: Optional blocking callable(estimated_tokens), called with
+            estimate_call_tokens before every attempt so retries are metered too
+        **kwargs: Passed through to generate_content (e.g. stream=True)
+        
+    Returns:
+        Gemini response object
+    """
+    estimated_tokens = estimate_call_tokens(prompt, generation_config)
+    for attempt in range(MAX_LLM_ATTEMPTS):
+        if rate_limit is not None:
+            rate_limit(estimated_tokens)
+        try:
+            return model.generate_content(prompt, generation_config=generation_config, **kwargs)
+        except RETRYABLE_ERRORS:
+            if attempt == MAX_LLM_ATTEMPTS - 1:
+                raise
+            delay = min(RETRY_MAX_DELAY_S, RETRY_BASE_DELAY_S * 2 ** attempt)
+            time.sleep(delay + random.uniform(0, RETRY_BASE_DELAY_S))
+
+
+# String forms of missing/invalid values (compared lower-cased)
+NAN_SENTINELS = frozenset({'nan', 'none', 'nat', 'inf', '-inf'})
+
 
 def clean_value(value):
     """Clean a value to ensure it's JSON-compatible."""
-    import math
-    import numpy as np
-    
     # Handle None
     if value is None:
         return 'N/A'
     
-    # Handle NaN and infinity
-    if isinstance(value, float):
-        if math.isnan(value) or math.isinf(value):
-            return 'N/A'
+    # Strings: only the sentinel spellings are missing values
+    if isinstance(value, str):
+        return 'N/A' if value.lower() in NAN_SENTINELS else value
+    
+    # Handle NaN and infinity (Python and numpy floats)
+    if isinstance(value, (float, np.floating)):
+        return value if math.isfinite(value) else 'N/A'
     
-    # Handle numpy NaN
+    # Integers and bools are always valid
+    if isinstance(value, (int, np.integer)):
+        return value
+    
+    # Anything else (pandas NaT, Decimal, ...) by its string form
+    return 'N/A' if str(value).lower() in NAN_SENTINELS else value
+
+
+def reformat_structured_answer(raw_answer: str, query: str):
+    """
+    Rewrite a JSON-ish LLM answer as plain text without another LLM call.
+    
+    Args:
+        raw_answer: LLM answer flagged as structured output
+        query: Original user query
+        
+    Returns:
+        str or None: Readable text, or None if Python can't make sense of it
+    """
+    # Valid JSON goes through the same formatters as convert_to_natural_language
     try:
-        if np.isnan(value):
-            return 'N/A'
-    except (TypeError, ValueError):
+        answer = format_json_answer(orjson.loads(raw_answer), query).strip()
+        # "Unknown" is the formatters' stand-in for a missing name: wrong JSON shape
+        if not answer or "Unknown" in answer:
+            return None
+        return answer
+    except json.JSONDecodeError:
         pass
+    except (TypeError, AttributeError, KeyError):
+        # Parsed, but not in a shape the formatters understand
+        return None
     
-    # Convert to string and check
-    str_value = str(value)
-    if str_value.lower() in ['nan', 'none', 'nat', 'inf', '-inf']:
-        return 'N/A'
+    # Broken JSON that still carries a text field: keep just that text
+    match = JSON_TEXT_FIELD_RE.search(raw_answer)
+    if match:
+        return match.group(1).replace('\\"', '"').strip() or None
+    
+    # Comma-separated quoted values ("name", "company", "role")
+    values = QUOTED_VALUE_RE.findall(raw_answer)
+    if len(values) >= 3:
+        return f"Lead information: {' | '.join(values)}"
     
-    return value
+    return None
 
 
 def convert_to_natural_language(response_text: str, query: str) -> str:
@@ -53,21 +161,8 @@ def convert_to_natural_language(response_text: str, query: str) -> str:
     if response_text.startswith('{') or response_text.startswith('['):
         try:
             # Try to parse as JSON
-            data = json.loads(response_text)
-            
-            # Convert based on query type
-            query_lower = query.lower()
-            
-            if "least" in query_lower or "lowest" in query_lower:
-                return format_least_score_response(data, query)
-            elif "top" in query_lower or "best" in query_lower or "high" in query_lower:
-                return format_top_leads_response(data)
-            elif "who" in query_lower or "which" in query_lower:
-                return format_who_response(data)
-            elif "all" in query_lower and "lead" in query_lower:
-                return format_all_leads_response(data)
-            else:
-                return format_general_response(data)
+            data = orjson.loads(response_text)
+            return format_json_answer(data, query)
                 
         except (json.JSONDecodeError, TypeError) as e:
             # JSON parsing failed, but it looks like JSON
@@ -78,6 +173,70 @@ def convert_to_natural_language(response_text: str, query: str) -> str:
     return response_text
 
 
+def lead_scores_array(leads: list) -> np.ndarray:
+    """
+    Collect lead scores into a NumPy array (one Python pass over the leads).
+    
+    Args:
+        leads: Scored leads
+        
+    Returns:
+        np.ndarray: float64 scores in lead order (missing scores are 0)
+    """
+    return np.fromiter((lead.get('score', 0) for lead in leads), dtype=np.float64, count=len(leads))
+
+
+def count_leads_by_priority(scores: np.ndarray) -> tuple:
+    """
+    Count leads per priority tier.
+    
+    Args:
+        scores: Array from lead_scores_array
+        
+    Returns:
+        tuple: (high, medium, low) counts for scores 80-100, 40-79 and 1-39
+    """
+    high = int(np.count_nonzero(scores >= 80))
+    medium = int(np.count_nonzero((scores >= 40) & (scores < 80)))
+    low = int(np.count_nonzero((scores > 0) & (scores < 40)))
+    return high, medium, low
+
+
+def rank_lead_indices(scores: np.ndarray, n: int, lowest: bool = False) -> np.ndarray:
+    """
+    Pick the n highest (or lowest) scores without sorting every lead.
+    
+    Matches sorted(leads, key=score, reverse=True)[:n] (or [-n:] with
+    lowest=True) exactly, including which tied leads are picked and their
+    order, using an O(N) partition instead of an O(N log N) sort.
+    
+    Args:
+        scores: Array from lead_scores_array
+        n: Number of leads to pick
+        lowest: Pick the lowest scores instead of the highest
+        
+    Returns:
+        np.ndarray: Lead indices, highest score first, ties in input order
+    """
+    if len(scores) <= n:
+        picked = np.arange(len(scores))
+    elif lowest:
+        # Boundary ties: a stable descending sort puts later leads last
+        kth = np.partition(scores, n - 1)[n - 1]
+        below = np.flatnonzero(scores < kth)
+        ties = np.flatnonzero(scores == kth)
+        picked = np.concatenate([below, ties[len(ties) - (n - len(below)):]])
+    else:
+        # Boundary ties: a stable descending sort puts earlier leads first
+        kth = np.partition(scores, len(scores) - n)[len(scores) - n]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)
+        picked = np.concatenate([above, ties[:n - len(above)]])
+    
+    picked.sort()
+    return picked[np.argsort(-scores[picked], kind='stable')]
+
+
 def format_top_leads_response(data) -> str:
     """Format JSON data about top leads into readable text."""
     if isinstance(data, dict):
@@ -96,7 +255,7 @@ def format_top_leads_response(data) -> str:
         return str(data)
     
     # Build natural response
-    response = "Based on your lead data, here are the top leads you should prioritize:\n\n"
+    parts = ["Based on your lead data, here are the top leads you should prioritize:\n\n"]
     
     for idx, lead in enumerate(leads[:5], 1):
         if isinstance(lead, dict):
@@ -106,16 +265,16 @@ def format_top_leads_response(data) -> str:
             role = lead.get("role", "N/A")
             priority = lead.get("priority", "")
             
-            response += f"**{idx}. {name}** - {role}\n"
-            response += f"   • Company: {company}\n"
-            response += f"   • Score: {score}/100 {priority}\n"
+            parts.append(f"**{idx}. {name}** - {role}\n")
+            parts.append(f"   • Company: {company}\n")
+            parts.append(f"   • Score: {score}/100 {priority}\n")
             
             if "justification" in lead:
-                response += f"   • Why: {lead['justification']}\n"
+                parts.append(f"   • Why: {lead['justification']}\n")
             
-            response += "\n"
+            parts.append("\n")
     
-    return response
+    return "".join(parts)
 
 
 def format_who_response(data) -> str:
@@ -127,17 +286,19 @@ def format_who_response(data) -> str:
         role = data.get("role", "N/A")
         email = data.get("email", "N/A")
         
-        response = f"The top lead is **{name}**\n\n"
-        response += f"📋 **Details:**\n"
-        response += f"• Role: {role}\n"
-        response += f"• Company: {company}\n"
-        response += f"• Score: {score}/100\n"
-        response += f"• Email: {email}\n\n"
+        parts = [
+            f"The top lead is **{name}**\n\n",
+            "📋 **Details:**\n",
+            f"• Role: {role}\n",
+            f"• Company: {company}\n",
+            f"• Score: {score}/100\n",
+            f"• Email: {email}\n\n"
+        ]
         
         if "justification" in data:
-            response += f"🎯 **Why this lead matters:**\n{data['justification']}\n"
+            parts.append(f"🎯 **Why this lead matters:**\n{data['justification']}\n")
         
-        return response
+        return "".join(parts)
     
     return str(data)
 
@@ -153,14 +314,14 @@ def format_least_score_response(data, query) -> str:
         if "lowPriorityLeads" in data:
             leads = data.get("lowPriorityLeads", [])
             if leads:
-                response = f"Here are your lowest-scoring leads:\n\n"
+                parts = ["Here are your lowest-scoring leads:\n\n"]
                 for idx, lead in enumerate(leads[:5], 1):
                     if isinstance(lead, dict):
                         name = lead.get("name", "Unknown")
                         score = lead.get("score", 0)
                         reason = lead.get("reason", "Poor fit")
-                        response += f"{idx}. **{name}** - Score: {score}/100\n   Reason: {reason}\n\n"
-                return response
+                        parts.append(f"{idx}. **{name}** - Score: {score}/100\n   Reason: {reason}\n\n")
+                return "".join(parts)
     
     # Fallback to general formatting
     return format_general_response(data)
@@ -169,33 +330,44 @@ def format_least_score_response(data, query) -> str:
 def format_all_leads_response(data) -> str:
     """Format response for 'show all leads' questions."""
     if isinstance(data, list):
-        response = "Here's a summary of all your leads:\n\n"
+        parts = ["Here's a summary of all your leads:\n\n"]
         
-        # Group by priority
-        high_priority = [l for l in data if isinstance(l, dict) and l.get('score', 0) >= 80]
-        medium_priority = [l for l in data if isinstance(l, dict) and 40 <= l.get('score', 0) < 80]
-        low_priority = [l for l in data if isinstance(l, dict) and 0 < l.get('score', 0) < 40]
+        # Count priorities in one pass, keeping only the 5 high-priority leads listed
+        top_high = []
+        high_count = medium_count = low_count = 0
+        for lead in data:
+            if not isinstance(lead, dict):
+                continue
+            score = lead.get('score', 0)
+            if score >= 80:
+                high_count += 1
+                if len(top_high) < 5:
+                    top_high.append(lead)
+            elif score >= 40:
+                medium_count += 1
+            elif score > 0:
+                low_count += 1
         
-        if high_priority:
-            response += f"🔥 **High Priority ({len(high_priority)} leads):**\n"
-            for lead in high_priority[:5]:
+        if high_count:
+            parts.append(f"🔥 **High Priority ({high_count} leads):**\n")
+            for lead in top_high:
                 name = lead.get("name", "Unknown")
                 company = lead.get("company", "N/A")
                 score = lead.get("score", 0)
-                response += f"• {name} from {company} - {score}/100\n"
-            if len(high_priority) > 5:
-                response += f"  ...and {len(high_priority) - 5} more\n"
-            response += "\n"
+                parts.append(f"• {name} from {company} - {score}/100\n")
+            if high_count > 5:
+                parts.append(f"  ...and {high_count - 5} more\n")
+            parts.append("\n")
         
-        if medium_priority:
-            response += f"⚠️ **Medium Priority ({len(medium_priority)} leads):**\n"
-            response += f"Focus on these after contacting high-priority leads\n\n"
+        if medium_count:
+            parts.append(f"⚠️ **Medium Priority ({medium_count} leads):**\n")
+            parts.append("Focus on these after contacting high-priority leads\n\n")
         
-        if low_priority:
-            response += f"❄️ **Low Priority ({len(low_priority)} leads):**\n"
-            response += f"Consider these if you have extra capacity\n"
+        if low_count:
+            parts.append(f"❄️ **Low Priority ({low_count} leads):**\n")
+            parts.append("Consider these if you have extra capacity\n")
         
-        return response
+        return "".join(parts)
     
     return format_general_response(data)
 
@@ -203,8 +375,6 @@ def format_all_leads_response(data) -> str:
 def format_general_response(data) -> str:
     """Format general JSON responses into readable text."""
     if isinstance(data, dict):
-        response = ""
-        
         # Check for common summary keys first
         if "summary" in data:
             return str(data["summary"])
@@ -221,118 +391,166 @@ def format_general_response(data) -> str:
             medium_count = data.get("mediumPriorityLeads", 0)
             low_count = data.get("lowPriorityLeads", 0)
             
-            response = f"**Lead Summary:**\n\n"
-            response += f"🔥 High Priority: {high_count} leads\n"
-            response += f"⚠️ Medium Priority: {medium_count} leads\n"
-            response += f"❄️ Low Priority: {low_count} leads\n\n"
+            parts = [
+                "**Lead Summary:**\n\n",
+                f"🔥 High Priority: {high_count} leads\n",
+                f"⚠️ Medium Priority: {medium_count} leads\n",
+                f"❄️ Low Priority: {low_count} leads\n\n"
+            ]
             
             if "topLeads" in data:
                 leads = data["topLeads"]
-                response += "\n**Top Leads to Contact:**\n"
+                parts.append("\n**Top Leads to Contact:**\n")
                 for idx, lead in enumerate(leads[:5], 1):
                     if isinstance(lead, dict):
                         name = lead.get("name", "Unknown")
                         company = lead.get("company", "N/A")
                         score = lead.get("score", 0)
-                        response += f"{idx}. {name} from {company} ({score}/100)\n"
+                        parts.append(f"{idx}. {name} from {company} ({score}/100)\n")
             
-            return response
+            return "".join(parts)
         
         # Generic dict formatting
+        parts = []
         for key, value in data.items():
-            response += f"**{key.replace('_', ' ').title()}:**\n"
+            parts.append(f"**{key.replace('_', ' ').title()}:**\n")
             if isinstance(value, list):
                 for item in value:
                     if isinstance(item, dict):
                         # Format dict items nicely
                         name = item.get("name", item.get("title", "Item"))
-                        response += f"• {name}\n"
+                        parts.append(f"• {name}\n")
                     else:
-                        response += f"• {item}\n"
+                        parts.append(f"• {item}\n")
             elif isinstance(value, dict):
                 for k, v in value.items():
-                    response += f"  {k}: {v}\n"
+                    parts.append(f"  {k}: {v}\n")
             else:
-                response += f"{value}\n"
-            response += "\n"
+                parts.append(f"{value}\n")
+            parts.append("\n")
         
-        return response if response else str(data)
+        return "".join(parts) if parts else str(data)
         
     elif isinstance(data, list):
-        response = ""
+        parts = []
         for idx, item in enumerate(data, 1):
             if isinstance(item, dict):
                 name = item.get("name", item.get("title", f"Item {idx}"))
                 score = item.get("score", "")
                 score_str = f" - {score}/100" if score else ""
-                response += f"{idx}. {name}{score_str}\n"
+                parts.append(f"{idx}. {name}{score_str}\n")
             else:
-                response += f"{idx}. {item}\n"
-        return response
+                parts.append(f"{idx}. {item}\n")
+        return "".join(parts)
     
     return str(data)
 
 
-def create_chat_prompt(query: str, leads_data: list) -> str:
+# Query intent -> formatter for JSON answers, checked in priority order
+# (substring matches, so "highest" counts as "high")
+ANSWER_FORMATTERS = (
+    (re.compile(r'least|lowest'), format_least_score_response),
+    (re.compile(r'top|best|high'), lambda data, query: format_top_leads_response(data)),
+    (re.compile(r'who|which'), lambda data, query: format_who_response(data)),
+    (re.compile(r'^(?=.*all)(?=.*lead)', re.DOTALL), lambda data, query: format_all_leads_response(data)),
+)
+
+
+def format_json_answer(data, query: str) -> str:
     """
-    Create a prompt for the chat agent with lead data context.
+    Format parsed JSON from the LLM with the formatter matching the query type.
     
     Args:
-        query: User's question
-        leads_data: List of scored leads
+        data: Parsed JSON (dict, list or scalar)
+        query: Original user query
         
     Returns:
-        str: Formatted prompt for LLM
+        str: Human-readable text
     """
-    # Prepare data summary
-    total_leads = len(leads_data)
-    high_priority = len([l for l in leads_data if l.get('score', 0) >= 80])
-    medium_priority = len([l for l in leads_data if 40 <= l.get('score', 0) < 80])
-    low_priority = len([l for l in leads_data if 0 < l.get('score', 0) < 40])
+    query_lower = query.lower()
     
-    # Get top 10 AND bottom 5 leads for context
-    sorted_leads = sorted(leads_data, key=lambda x: x.get('score', 0), reverse=True)
-    top_leads = sorted_leads[:10]
-    bottom_leads = sorted_leads[-5:] if len(sorted_leads) > 10 else []
+    for intent_re, formatter in ANSWER_FORMATTERS:
+        if intent_re.search(query_lower):
+            return formatter(data, query)
+    return format_general_response(data)
+
+
+# Most leads quoted from the question itself, so a broad query can't pull the
+# whole lead list into the prompt
+MAX_MENTIONED_LEADS = 10
+
+
+# Leads scoring at least this much keep their justification in the prompt rows
+CONTEXT_JUSTIFICATION_MIN_SCORE = 90
+
+
+def csv_field(value) -> str:
+    """Render a value as one CSV field, on a single line, quoted only if it contains a comma or quote."""
+    text = " ".join(str(value).split())
+    if ',' in text or '"' in text:
+        text = '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def format_lead_context_line(idx: int, lead: dict, with_justification: bool = False) -> str:
+    """
+    Format one lead as a compact CSV row of prompt context.
     
-    # Format top leads
-    top_leads_text = ""
-    for idx, lead in enumerate(top_leads, 1):
-        name = clean_value(lead.get('full_name', 'Unknown'))
-        company = clean_value(lead.get('company_name', 'N/A'))
-        role = clean_value(lead.get('role', 'N/A'))
-        score = int(lead.get('score', 0)) if lead.get('score') else 0
-        email = clean_value(lead.get('email', 'N/A'))
-        justification = clean_value(lead.get('justification', 'N/A'))
-        
-        top_leads_text += f"\n{idx}. {name} from {company} - {role} - Score: {score}/100 - Email: {email}"
-        if justification and justification != 'N/A':
-            top_leads_text += f"\n   Why: {justification}"
+    Columns are idx,name,company,role,score,email (see CHAT_SYSTEM_PROMPT).
+    Labelled English lines cost far more tokens per lead for the same data.
     
-    # Format bottom leads
-    bottom_leads_text = ""
-    if bottom_leads:
-        for idx, lead in enumerate(bottom_leads, 1):
-            name = clean_value(lead.get('full_name', 'Unknown'))
-            company = clean_value(lead.get('company_name', 'N/A'))
-            role = clean_value(lead.get('role', 'N/A'))
-            score = int(lead.get('score', 0)) if lead.get('score') else 0
-            email = clean_value(lead.get('email', 'N/A'))
-            
-            bottom_leads_text += f"\n{idx}. {name} from {company} - {role} - Score: {score}/100 - Email: {email}"
+    Args:
+        idx: Position in the list (1-based)
+        lead: Scored lead
+        with_justification: Add the score justification as a last column for
+            leads scoring CONTEXT_JUSTIFICATION_MIN_SCORE or more
+        
+    Returns:
+        str: Context row, starting with a newline
+    """
+    name = clean_value(lead.get('full_name', 'Unknown'))
+    company = clean_value(lead.get('company_name', 'N/A'))
+    role = clean_value(lead.get('role', 'N/A'))
+    score = lead.get('score')
+    score = int(score) if score else 0
+    email = clean_value(lead.get('email', 'N/A'))
     
-    prompt = f"""You are a helpful AI Sales Assistant. A sales team member is asking you about their leads.
+    fields = [str(idx), csv_field(name), csv_field(company), csv_field(role), str(score), csv_field(email)]
+    if with_justification and score >= CONTEXT_JUSTIFICATION_MIN_SCORE:
+        justification = clean_value(lead.get('justification', 'N/A'))
+        if justification and justification != 'N/A':
+            fields.append(csv_field(justification))
+    return "\n" + ",".join(fields)
 
-CONTEXT - You have analyzed {total_leads} leads:
-• {high_priority} High Priority leads (scores 80-100)
-• {medium_priority} Medium Priority leads (scores 40-79)  
-• {low_priority} Low Priority leads (scores 1-39)
 
-TOP 10 HIGHEST-SCORING LEADS:{top_leads_text}
+def find_mentioned_leads(query: str, leads_data: list) -> list:
+    """
+    Find leads whose name or company appears in the question.
+    
+    Args:
+        query: User's question
+        leads_data: List of scored leads
+        
+    Returns:
+        list: Up to MAX_MENTIONED_LEADS matching leads, in input order
+    """
+    query_lower = query.lower()
+    mentioned = []
+    for lead in leads_data:
+        for field in ('full_name', 'company_name'):
+            value = lead.get(field)
+            # Skip missing values and short strings that would match inside words
+            if isinstance(value, str) and len(value) >= 3 and value.lower() in query_lower:
+                mentioned.append(lead)
+                break
+        if len(mentioned) >= MAX_MENTIONED_LEADS:
+            break
+    return mentioned
 
-LOWEST-SCORING 5 LEADS:{bottom_leads_text}
 
-QUESTION: {query}
+# Instructions shared by every lead question. Kept verbatim at the start of the
+# prompt so Gemini can reuse the cached prefix; lead data and the question follow.
+CHAT_SYSTEM_PROMPT = """You are a helpful AI Sales Assistant. A sales team member is asking you about their leads.
 
 CRITICAL INSTRUCTIONS - YOU MUST FOLLOW EXACTLY:
 1. Write your answer as a CONVERSATIONAL PARAGRAPH, like you're talking to a friend
@@ -348,12 +566,144 @@ GOOD EXAMPLE (what TO do):
 BAD EXAMPLE (what NOT to do):
 "Jacob Turner", "Prime Consulting", "COO", "100/100", "jacob.turner@corp.com"
 
-Now write your answer as a natural, flowing paragraph:"""
+The lead data and the question follow. Each lead is a CSV row: idx,name,company,role,score,email
+Rows for leads scoring 90+ may end with one more column: why the lead scored that high."""
+
+
+# Closing line of every lead question prompt
+CHAT_PROMPT_FOOTER = "Now write your answer as a natural, flowing paragraph:"
+
+# Lead context blocks for recent lead sets, keyed on the chat_cache_key lead
+# fingerprint, so follow-up questions about the same leads skip rebuilding it
+LEAD_CONTEXT_CACHE_SIZE = 32
+lead_context_cache = OrderedDict()  # leads_hash -> context block, oldest first
+lead_context_cache_lock = threading.Lock()
+
+
+def build_lead_context(leads_data: list) -> str:
+    """
+    Build the question-independent part of the chat prompt for a lead set.
+    
+    Args:
+        leads_data: List of scored leads
+        
+    Returns:
+        str: Priority counts plus the top 10 and bottom 5 leads
+    """
+    # Prepare data summary from one array of scores
+    total_leads = len(leads_data)
+    scores = lead_scores_array(leads_data)
+    high_priority, medium_priority, low_priority = count_leads_by_priority(scores)
+    
+    # Get top 10 AND bottom 5 leads for context; partial selection instead of
+    # sorting every lead (bottom leads listed highest first, like the top list)
+    top_leads = [leads_data[i] for i in rank_lead_indices(scores, 10)]
+    bottom_leads = [leads_data[i] for i in rank_lead_indices(scores, 5, lowest=True)] if total_leads > 10 else []
+    
+    # Format top leads
+    top_leads_text = "".join(
+        format_lead_context_line(idx, lead, with_justification=True)
+        for idx, lead in enumerate(top_leads, 1)
+    )
+    
+    # Format bottom leads
+    bottom_leads_text = "".join(
+        format_lead_context_line(idx, lead)
+        for idx, lead in enumerate(bottom_leads, 1)
+    )
+    
+    return f"""CONTEXT - You have analyzed {total_leads} leads:
+• {high_priority} High Priority leads (scores 80-100)
+• {medium_priority} Medium Priority leads (scores 40-79)  
+• {low_priority} Low Priority leads (scores 1-39)
+
+TOP 10 HIGHEST-SCORING LEADS:{top_leads_text}
+
+LOWEST-SCORING 5 LEADS:{bottom_leads_text}"""
+
+
+def get_lead_context(leads_data: list, leads_hash: bytes = None) -> str:
+    """
+    Get the lead context block, reusing the cached one for a known lead set.
+    
+    Args:
+        leads_data: List of scored leads
+        leads_hash: Lead fingerprint from chat_cache_key (no caching if None)
+        
+    Returns:
+        str: Output of build_lead_context for these leads
+    """
+    if leads_hash is None:
+        return build_lead_context(leads_data)
+    
+    with lead_context_cache_lock:
+        context = lead_context_cache.get(leads_hash)
+        if context is not None:
+            lead_context_cache.move_to_end(leads_hash)
+            return context
+    
+    context = build_lead_context(leads_data)
+    with lead_context_cache_lock:
+        lead_context_cache[leads_hash] = context
+        while len(lead_context_cache) > LEAD_CONTEXT_CACHE_SIZE:
+            lead_context_cache.popitem(last=False)
+    return context
+
+
+def create_chat_prompt(query: str, leads_data: list, leads_hash: bytes = None) -> str:
+    """
+    Create a prompt for the chat agent with lead data context.
+    
+    Args:
+        query: User's question
+        leads_data: List of scored leads
+        leads_hash: Lead fingerprint from chat_cache_key, to reuse the context block
+        
+    Returns:
+        str: Formatted prompt for LLM
+    """
+    context = get_lead_context(leads_data, leads_hash)
+    
+    # Leads the question names directly (by person or company) that the
+    # top/bottom lists may not include
+    mentioned_leads = find_mentioned_leads(query, leads_data)
+    mentioned_leads_text = "".join(
+        format_lead_context_line(idx, lead, with_justification=True)
+        for idx, lead in enumerate(mentioned_leads, 1)
+    )
+    if mentioned_leads_text:
+        mentioned_leads_text = f"\n\nLEADS MENTIONED IN THE QUESTION:{mentioned_leads_text}"
+    
+    # Static instructions first so every chat call shares the same prompt prefix;
+    # then the lead context, which is also stable across questions about the same leads
+    return f"{CHAT_SYSTEM_PROMPT}\n\n{context}{mentioned_leads_text}\n\nQUESTION: {query}\n\n{CHAT_PROMPT_FOOTER}"
+
+
+# Canned casual reply when Gemini fails; never cached, so the next "hi" retries Gemini
+CASUAL_CHAT_FALLBACK = "I'm doing well, thank you! 😊 Is there anything about your leads I can help you with?"
 
-    return prompt
 
+# Text-only generation config for casual chat
+CASUAL_CHAT_CONFIG = genai.GenerationConfig(
+    temperature=0.9,  # More creative for casual chat
+    max_output_tokens=150,
+    top_p=0.95
+)
+
+
+def create_casual_prompt(query: str) -> str:
+    """Create the prompt for a casual, non-lead question."""
+    return f"""You are a friendly AI assistant helping a sales team. 
+The user just asked you a casual question that's not about their leads.
 
-def handle_casual_chat(model, query: str, leads_data: list) -> dict:
+Respond naturally and friendly, then gently remind them you're here to help with their lead data if needed.
+
+Keep your response brief (1-2 sentences) and friendly.
+
+USER QUESTION: {query}"""
+
+
+def handle_casual_chat(model, query: str, leads_data: list, rate_limit=None) -> dict:
     """
     Handle casual, non-lead-related conversation.
     
@@ -361,29 +711,16 @@ def handle_casual_chat(model, query: str, leads_data: list) -> dict:
         model: Initialized Gemini model
         query: User's casual question
         leads_data: List of scored leads (for context)
+        rate_limit: Optional blocking callable(estimated_tokens) run before
+            every Gemini call (see generate_with_retry)
         
     Returns:
         dict: Friendly response
     """
     try:
-        # Create a simple conversational prompt
-        casual_prompt = f"""You are a friendly AI assistant helping a sales team. 
-The user just asked you a casual question that's not about their leads.
-
-USER QUESTION: {query}
-
-Respond naturally and friendly, then gently remind them you're here to help with their lead data if needed.
-
-Keep your response brief (1-2 sentences) and friendly."""
-
-        # Create text-only config for casual chat
-        text_config = genai.GenerationConfig(
-            temperature=0.9,  # More creative for casual chat
-            max_output_tokens=150,
-            top_p=0.95
+        response = generate_with_retry(
+            model, create_casual_prompt(query), CASUAL_CHAT_CONFIG, rate_limit
         )
-        
-        response = model.generate_content(casual_prompt, generation_config=text_config)
         answer = response.text.strip()
         
         return {
@@ -396,13 +733,24 @@ Keep your response brief (1-2 sentences) and friendly."""
     except Exception as e:
         # Fallback for casual chat
         return {
-            "answer": "I'm doing well, thank you! 😊 Is there anything about your leads I can help you with?",
+            "answer": CASUAL_CHAT_FALLBACK,
             "success": True,
             "error": None,
             "leads_analyzed": 0
         }
 
 
+# Lead-related keywords
+LEAD_KEYWORDS = [
+    'lead', 'leads', 'score', 'priority', 'contact', 'call', 'email',
+    'company', 'companies', 'customer', 'prospect', 'sales',
+    'top', 'best', 'highest', 'lowest', 'budget', 'urgent',
+    'who', 'which', 'what', 'show', 'list', 'tell me about',
+    'recommend', 'prioritize', 'focus', 'crm', 'deal'
+]
+LEAD_KEYWORD_RE = re.compile("|".join(re.escape(keyword) for keyword in LEAD_KEYWORDS))
+
+
 def is_lead_related_question(query: str) -> bool:
     """
     Determine if the question is about lead data or just casual conversation.
@@ -413,35 +761,378 @@ def is_lead_related_question(query: str) -> bool:
     Returns:
         bool: True if about leads, False if casual chat
     """
-    query_lower = query.lower()
+    # Single scan for any lead keyword (substring match, so "scores" and
+    # "calling" count too)
+    return LEAD_KEYWORD_RE.search(query.lower()) is not None
+
+
+# =============================================================================
+# CHAT ANSWER CACHE
+# =============================================================================
+
+# Chat answers, keyed on (normalized query, lead data fingerprint)
+CHAT_CACHE_SIZE = 512
+CHAT_CACHE_TTL_S = 600
+
+# Lead fields that reach the chat prompt; changing any of them changes the key
+CHAT_FINGERPRINT_FIELDS = ('full_name', 'company_name', 'role', 'score', 'email', 'justification')
+
+chat_answer_cache = OrderedDict()  # cache_key -> (stored_at, result), oldest first
+chat_answer_cache_lock = threading.Lock()  # chat_with_leads runs in executor threads
+
+# Near-duplicate lead questions ("top 5 leads" / "who are my top 5?")
+semantic_chat_cache = SemanticCache(ttl_s=CHAT_CACHE_TTL_S)
+
+# Semantic cache bucket for casual chat, whose answers don't depend on the leads
+CASUAL_CHAT_BUCKET = b"casual"
+
+# Ranking words -> direction. "highest" / "lowest" and "high" / "low priority"
+# embed almost identically, so semantic hits must agree on these too
+RANKING_DIRECTIONS = {
+    'top': 'high', 'best': 'high', 'high': 'high', 'highest': 'high',
+    'low': 'low', 'lowest': 'low', 'least': 'low', 'worst': 'low', 'bottom': 'low',
+    'medium': 'medium',
+}
+RANKING_WORD_RE = re.compile(r'\b(' + '|'.join(RANKING_DIRECTIONS) + r')\b')
+
+
+def chat_cache_key(query: str, leads_data: list) -> tuple:
+    """
+    Build the chat answer cache key for a question about a lead set.
+    
+    Args:
+        query: User's question
+        leads_data: List of scored leads
+        
+    Returns:
+        tuple: (normalized query, 16-byte digest of the prompt-relevant lead fields)
+    """
+    query_norm = " ".join(query.lower().split())
+    rows = [[lead.get(field) for field in CHAT_FINGERPRINT_FIELDS] for lead in leads_data]
+    leads_hash = hashlib.blake2b(orjson.dumps(rows, default=str), digest_size=16).digest()
+    return query_norm, leads_hash
+
+
+def get_cached_chat_answer(cache_key: tuple):
+    """
+    Look up a cached chat answer that is still within its TTL.
+    
+    Args:
+        cache_key: Key from chat_cache_key
+        
+    Returns:
+        dict or None: Copy of the cached chat result, or None on a miss
+    """
+    with chat_answer_cache_lock:
+        entry = chat_answer_cache.get(cache_key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.monotonic() - stored_at > CHAT_CACHE_TTL_S:
+            del chat_answer_cache[cache_key]
+            return None
+        chat_answer_cache.move_to_end(cache_key)
+        return dict(result)
+
+
+def store_chat_answer(cache_key: tuple, result: dict, stored_at: float = None):
+    """
+    Cache a chat result, evicting the least recently used entry when full.
+    
+    Args:
+        cache_key: Key from chat_cache_key
+        result: Chat result
+        stored_at: time.monotonic() the answer was generated at, if earlier
+            than now (keeps a promoted semantic hit on its original TTL)
+    """
+    if stored_at is None:
+        stored_at = time.monotonic()
+    with chat_answer_cache_lock:
+        chat_answer_cache[cache_key] = (stored_at, dict(result))
+        chat_answer_cache.move_to_end(cache_key)
+        while len(chat_answer_cache) > CHAT_CACHE_SIZE:
+            chat_answer_cache.popitem(last=False)
+
+
+def semantic_cache_bucket(cache_key: tuple, leads_data: list, is_casual: bool):
+    """
+    Semantic cache bucket for a question: its lead set plus its answer intent.
+    
+    Questions only match within a bucket, so an answer is reused only for the
+    same leads, the same ANSWER_FORMATTERS intent, the same ranking direction
+    (top vs lowest, high vs low priority) and the same named leads ("John
+    Smith's email" vs "Jane Smith's email" embed almost identically).
+    
+    Args:
+        cache_key: chat_cache_key(query, leads_data)
+        leads_data: List of scored leads
+        is_casual: True for casual chat (one shared bucket)
+        
+    Returns:
+        Hashable bucket key
+    """
+    if is_casual:
+        return CASUAL_CHAT_BUCKET
+    query_norm, leads_hash = cache_key
+    intent = next(
+        (i for i, (intent_re, _) in enumerate(ANSWER_FORMATTERS) if intent_re.search(query_norm)),
+        None
+    )
+    directions = frozenset(RANKING_DIRECTIONS[word] for word in RANKING_WORD_RE.findall(query_norm))
+    mentioned = tuple(
+        (lead.get('full_name'), lead.get('company_name'))
+        for lead in find_mentioned_leads(query_norm, leads_data)
+    )
+    return leads_hash, intent, directions, mentioned
+
+
+def lookup_chat_answer(query: str, leads_data: list, cache_key: tuple) -> tuple:
+    """
+    Find a cached answer to a chat query without calling Gemini.
+    
+    Lookup order: exact match on the normalized question, then a semantic
+    match against earlier questions with the same leads and intent (casual
+    chat is matched across all lead sets). A semantic hit is copied into the
+    exact cache without renewing its TTL.
+    
+    Args:
+        query: User's question
+        leads_data: List of scored leads
+        cache_key: chat_cache_key(query, leads_data)
+        
+    Returns:
+        tuple: (cached result or None, query embedding or None). Pass the
+        embedding on to chat_with_leads on a miss to avoid embedding twice.
+    """
+    cached = get_cached_chat_answer(cache_key)
+    if cached is not None:
+        return cached, None
+    
+    is_casual = not is_lead_related_question(query)
+    if not (leads_data or is_casual):
+        # Answered with a canned "no leads" reply, nothing to look up
+        return None, None
+    
+    cached, embedding, stored_at = semantic_chat_cache.lookup(
+        cache_key[0], semantic_cache_bucket(cache_key, leads_data, is_casual)
+    )
+    if cached is not None:
+        store_chat_answer(cache_key, cached, stored_at)
+    return cached, embedding
+
+
+def chat_with_leads(model, query: str, leads_data: list, cache_key: tuple = None, embedding=None,
+                    rate_limit=None) -> dict:
+    """
+    Answer a chat query, reusing a cached answer for a repeated question.
+    
+    Cached answers are found with lookup_chat_answer. Errors and the casual
+    fallback reply are never cached.
+    
+    Args:
+        model: Initialized Gemini model
+        query: User's question
+        leads_data: List of scored leads
+        cache_key: Precomputed chat_cache_key(query, leads_data), if available
+        embedding: Query embedding from an earlier lookup_chat_answer miss;
+            if given, the cache lookup is skipped
+        rate_limit: Optional blocking callable(estimated_tokens) run before
+            every Gemini call (see generate_with_retry)
+        
+    Returns:
+        dict: Response with answer and metadata
+    """
+    if cache_key is None:
+        cache_key = chat_cache_key(query, leads_data)
     
-    # Lead-related keywords
-    lead_keywords = [
-        'lead', 'leads', 'score', 'priority', 'contact', 'call', 'email',
-        'company', 'companies', 'customer', 'prospect', 'sales',
-        'top', 'best', 'highest', 'lowest', 'budget', 'urgent',
-        'who', 'which', 'what', 'show', 'list', 'tell me about',
-        'recommend', 'prioritize', 'focus', 'crm', 'deal'
-    ]
+    if embedding is None:
+        cached, embedding = lookup_chat_answer(query, leads_data, cache_key)
+        if cached is not None:
+            return cached
     
-    # Check if any lead keyword is in the question
-    return any(keyword in query_lower for keyword in lead_keywords)
+    result = generate_chat_answer(model, query, leads_data, cache_key[1], rate_limit)
+    cache_chat_result(cache_key, leads_data, result, not is_lead_related_question(query), embedding)
+    return result
 
 
-def chat_with_leads(model, query: str, leads_data: list) -> dict:
+def cache_chat_result(cache_key: tuple, leads_data: list, result: dict, is_casual: bool, embedding=None):
+    """
+    Cache a freshly generated chat result, unless it is an error or the casual fallback.
+    
+    Args:
+        cache_key: chat_cache_key(query, leads_data)
+        leads_data: List of scored leads
+        result: Chat result
+        is_casual: True for casual chat (shared semantic bucket)
+        embedding: Query embedding from the semantic cache lookup, if any
+    """
+    if is_casual:
+        cacheable = result["answer"] != CASUAL_CHAT_FALLBACK
+    else:
+        cacheable = result.get("success") and result.get("leads_analyzed")
+    if not cacheable:
+        return
+    
+    store_chat_answer(cache_key, result)
+    if embedding is not None:
+        semantic_chat_cache.store(
+            cache_key[0], semantic_cache_bucket(cache_key, leads_data, is_casual), embedding, result
+        )
+
+
+# Text-only generation config for lead questions (no JSON mode)
+LEAD_CHAT_CONFIG = genai.GenerationConfig(
+    temperature=0.7,  # More creative for chat
+    max_output_tokens=500,  # Allow longer responses
+    top_p=0.95,
+    top_k=40
+    # NO response_mime_type - defaults to plain text!
+)
+
+# Generation config for the fallback call that rewrites structured output as prose
+CONVERSION_CHAT_CONFIG = genai.GenerationConfig(
+    temperature=0.7,
+    max_output_tokens=500
+)
+
+
+def clean_chat_answer(model, raw_answer: str, query: str, llm_fallback: bool = True,
+                      rate_limit=None) -> str:
+    """
+    Turn a raw LLM answer into plain text.
+    
+    STEP 2: Check if conversion needed - reformat in Python, and ONLY make a
+            2nd API call if the answer can't be parsed or cleaned up locally
+    STEP 3: Python post-processing to strip any remaining JSON wrappers
+    
+    Args:
+        model: Initialized Gemini model
+        raw_answer: Stripped text of the LLM response
+        query: User's question
+        llm_fallback: Whether to make the 2nd API call; if False, None is
+            returned where it would be needed
+        rate_limit: Optional blocking callable(estimated_tokens) run before
+            every Gemini call (see generate_with_retry)
+        
+    Returns:
+        str: Plain text answer (None only with llm_fallback=False)
+    """
+    # ============================================================
+    # STEP 2: Check if conversion is needed (avoid extra API call)
+    # Reformat locally; only do second LLM call as a last resort
+    # ============================================================
+    # Check if raw answer has problematic formatting
+    # Pattern 1: Starts with JSON object
+    # Patterns 2-3: Multiple comma-separated quoted strings, or JSON field
+    # names (one regex scan for both)
+    needs_conversion = (
+        (raw_answer.startswith('{') and raw_answer.endswith('}'))
+        or NEEDS_CONVERSION_RE.search(raw_answer) is not None
+    )
+    
+    answer = raw_answer
+    if needs_conversion:
+        answer = reformat_structured_answer(raw_answer, query)
+    
+    if answer is None and not llm_fallback:
+        return None
+    elif answer is None:
+        # Python couldn't clean it up: second API call to convert to natural language
+        conversion_prompt = f"""Rewrite this as natural, conversational text without any JSON or structured formatting:
+
+{raw_answer}
+
+Write it as if you're talking to a colleague. No quotes, brackets, or comma-separated values. Just natural sentences."""
+
+        conversion_response = generate_with_retry(
+            model, conversion_prompt, CONVERSION_CHAT_CONFIG, rate_limit
+        )
+        answer = conversion_response.text.strip()
+    
+    # ============================================================
+    # STEP 3: Python post-processing to remove any remaining JSON
+    # ============================================================
+    # Try to parse as JSON and extract text content
+    try:
+        # Check if it's still JSON
+        if answer.startswith('{') and answer.endswith('}'):
+            data = orjson.loads(answer)
+            # Extract from common JSON fields
+            if 'summary' in data:
+                answer = data['summary']
+            elif 'response' in data:
+                answer = data['response']
+            elif 'answer' in data:
+                answer = data['answer']
+            elif 'message' in data:
+                answer = data['message']
+    except (json.JSONDecodeError, KeyError):
+        # Not JSON or failed to parse, keep as is
+        pass
+    
+    # Check if answer is comma-separated quoted strings (e.g., "name", "company", "role")
+    # Pattern: multiple quoted strings separated by commas
+    if QUOTED_PAIR_RE.search(answer):
+        # This is structured data, convert to readable text
+        # Extract all quoted values
+        values = QUOTED_VALUE_RE.findall(answer)
+        if len(values) >= 3:
+            # Try to reconstruct as natural text
+            # Assume pattern might be: name, company, role, score, email
+            answer = f"Lead information: {' | '.join(values)}"
+    
+    # Remove any remaining quotes around the entire string
+    return answer.strip('"').strip("'")
+
+
+def chat_error_result(error: Exception, leads_data: list) -> dict:
+    """
+    Build the chat result for a failed Gemini call.
+    
+    Args:
+        error: Exception raised by the call
+        leads_data: List of scored leads
+        
+    Returns:
+        dict: Unsuccessful response with a user-facing answer
+    """
+    error_msg = str(error)
+    
+    # Handle rate limit errors specifically
+    if "429" in error_msg or "Resource exhausted" in error_msg:
+        return {
+            "answer": "I've hit the API rate limit. The free tier of Gemini API has limited requests per minute. Please wait a moment and try again, or consider upgrading your API plan.",
+            "success": False,
+            "error": "Rate limit exceeded (429)",
+            "leads_analyzed": len(leads_data) if leads_data else 0
+        }
+    
+    return {
+        "answer": f"Sorry, I encountered an error: {error_msg}",
+        "success": False,
+        "error": error_msg,
+        "leads_analyzed": len(leads_data) if leads_data else 0
+    }
+
+
+def generate_chat_answer(model, query: str, leads_data: list, leads_hash: bytes = None,
+                         rate_limit=None) -> dict:
     """
     Process a chat query with SMART API USAGE to minimize rate limits.
     
     STEP 1: Query leads data and get response (1 API call)
-    STEP 2: Check if conversion needed - ONLY make 2nd API call if format is bad
-    STEP 3: Python post-processing to strip any remaining JSON wrappers
+    STEPS 2-3: clean_chat_answer - reformat structured output in Python,
+               with a 2nd API call only as a last resort
     
-    This approach minimizes API calls (usually just 1) while ensuring natural text output.
+    This approach minimizes API calls (almost always just 1) while ensuring natural text output.
     
     Args:
         model: Initialized Gemini model
         query: User's question
         leads_data: List of scored leads
+        leads_hash: Lead fingerprint from chat_cache_key, to reuse the prompt context
+        rate_limit: Optional blocking callable(estimated_tokens) run before
+            every Gemini call (see generate_with_retry)
         
     Returns:
         dict: Response with answer (guaranteed plain text) and metadata
@@ -450,7 +1141,7 @@ def chat_with_leads(model, query: str, leads_data: list) -> dict:
         # Check if question is about leads or just casual chat
         if not is_lead_related_question(query):
             # Handle casual conversation
-            return handle_casual_chat(model, query, leads_data)
+            return handle_casual_chat(model, query, leads_data, rate_limit)
         
         # Handle lead-related questions
         if not leads_data:
@@ -461,103 +1152,13 @@ def chat_with_leads(model, query: str, leads_data: list) -> dict:
             }
         
         # Create prompt with data context
-        prompt = create_chat_prompt(query, leads_data)
-        
-        # Create a text-only generation config (override JSON mode)
-        text_config = genai.GenerationConfig(
-            temperature=0.7,  # More creative for chat
-            max_output_tokens=500,  # Allow longer responses
-            top_p=0.95,
-            top_k=40
-            # NO response_mime_type - defaults to plain text!
-        )
+        prompt = create_chat_prompt(query, leads_data, leads_hash)
         
         # ============================================================
         # STEP 1: Get raw response from LLM (might be JSON/structured)
         # ============================================================
-        response = model.generate_content(
-            prompt,
-            generation_config=text_config
-        )
-        raw_answer = response.text.strip()
-        
-        # ============================================================
-        # STEP 2: Check if conversion is needed (avoid extra API call)
-        # Only do second LLM call if response has problematic formatting
-        # ============================================================
-        import re
-        
-        # Check if raw answer has problematic formatting
-        needs_conversion = False
-        
-        # Pattern 1: Starts with JSON object
-        if raw_answer.startswith('{') and raw_answer.endswith('}'):
-            needs_conversion = True
-        # Pattern 2: Multiple comma-separated quoted strings
-        elif re.search(r'"[^"]+"\s*,\s*"[^"]+"\s*,\s*"[^"]+"', raw_answer):
-            needs_conversion = True
-        # Pattern 3: Contains JSON field names
-        elif any(term in raw_answer.lower() for term in ['"summary":', '"response":', '"answer":', '"message":']):
-            needs_conversion = True
-        
-        if needs_conversion:
-            # Make second API call to convert to natural language
-            conversion_prompt = f"""Rewrite this as natural, conversational text without any JSON or structured formatting:
-
-{raw_answer}
-
-Write it as if you're talking to a colleague. No quotes, brackets, or comma-separated values. Just natural sentences."""
-
-            conversion_config = genai.GenerationConfig(
-                temperature=0.7,
-                max_output_tokens=500
-            )
-            
-            conversion_response = model.generate_content(
-                conversion_prompt,
-                generation_config=conversion_config
-            )
-            answer = conversion_response.text.strip()
-        else:
-            # Already natural language, skip second API call
-            answer = raw_answer
-        
-        # ============================================================
-        # STEP 3: Python post-processing to remove any remaining JSON
-        # ============================================================
-        import re
-        
-        # Try to parse as JSON and extract text content
-        try:
-            # Check if it's still JSON
-            if answer.startswith('{') and answer.endswith('}'):
-                data = json.loads(answer)
-                # Extract from common JSON fields
-                if 'summary' in data:
-                    answer = data['summary']
-                elif 'response' in data:
-                    answer = data['response']
-                elif 'answer' in data:
-                    answer = data['answer']
-                elif 'message' in data:
-                    answer = data['message']
-        except (json.JSONDecodeError, KeyError):
-            # Not JSON or failed to parse, keep as is
-            pass
-        
-        # Check if answer is comma-separated quoted strings (e.g., "name", "company", "role")
-        # Pattern: multiple quoted strings separated by commas
-        if re.search(r'"[^"]+"\s*,\s*"[^"]+"', answer):
-            # This is structured data, convert to readable text
-            # Extract all quoted values
-            values = re.findall(r'"([^"]+)"', answer)
-            if len(values) >= 3:
-                # Try to reconstruct as natural text
-                # Assume pattern might be: name, company, role, score, email
-                answer = f"Lead information: {' | '.join(values)}"
-        
-        # Remove any remaining quotes around the entire string
-        answer = answer.strip('"').strip("'")
+        response = generate_with_retry(model, prompt, LEAD_CHAT_CONFIG, rate_limit)
+        answer = clean_chat_answer(model, response.text.strip(), query, rate_limit=rate_limit)
         
         return {
             "answer": answer,
@@ -567,23 +1168,182 @@ Write it as if you're talking to a colleague. No quotes, brackets, or comma-sepa
         }
         
     except Exception as e:
-        error_msg = str(e)
+        return chat_error_result(e, leads_data)
+
+
+def stream_lead_answer(model, query: str, leads_data: list, leads_hash: bytes = None, rate_limit=None):
+    """
+    Stream the answer to a lead question, yielding text chunks as they arrive.
+    
+    An answer that starts out looking like JSON or quoted values is held back
+    and cleaned up in Python (clean_chat_answer without the 2nd API call)
+    before being sent in one piece. The result's answer is exactly the text
+    yielded. If the call fails, nothing more is yielded and the error is only
+    in the result.
+    
+    The answer caches are shared with /chat, so an answer only counts as
+    cacheable if /chat would have produced the same text: a streamed answer
+    that clean_chat_answer would change, or one that needs the 2nd API call,
+    is not.
+    
+    Yields:
+        str: Answer text chunks
         
-        # Handle rate limit errors specifically
-        if "429" in error_msg or "Resource exhausted" in error_msg:
-            return {
-                "answer": "I've hit the API rate limit. The free tier of Gemini API has limited requests per minute. Please wait a moment and try again, or consider upgrading your API plan.",
-                "success": False,
-                "error": "Rate limit exceeded (429)",
-                "leads_analyzed": len(leads_data) if leads_data else 0
-            }
+    Returns:
+        tuple: (final result as from generate_chat_answer, whether to cache it)
+    """
+    streaming = None  # Unknown until the first non-blank text arrives
+    try:
+        prompt = create_chat_prompt(query, leads_data, leads_hash)
+        response = generate_with_retry(model, prompt, LEAD_CHAT_CONFIG, rate_limit, stream=True)
+        
+        parts = []
+        for chunk in response:
+            parts.append(chunk.text)
+            if streaming is None:
+                head = "".join(parts).lstrip()
+                if head:
+                    # Structured output needs the whole answer to be cleaned up
+                    streaming = head[0] not in '{"'
+                    if streaming:
+                        yield head
+            elif streaming:
+                yield chunk.text
+        
+        raw_answer = "".join(parts).strip()
+        # /chat's answer, short of the 2nd API call (None if it needs one)
+        chat_answer = clean_chat_answer(model, raw_answer, query, llm_fallback=False)
+        if streaming:
+            answer = "".join(parts).lstrip()
+            cacheable = chat_answer == raw_answer
+        else:
+            answer = raw_answer if chat_answer is None else chat_answer
+            cacheable = chat_answer is not None
+            yield answer
+    except Exception as e:
+        return chat_error_result(e, leads_data), False
+    
+    result = {
+        "answer": answer,
+        "success": True,
+        "error": None,
+        "leads_analyzed": len(leads_data)
+    }
+    return result, cacheable
+
+
+def stream_casual_answer(model, query: str, rate_limit=None):
+    """
+    Stream the answer to a casual question, yielding text chunks as they arrive.
+    
+    Yields:
+        str: Answer text chunks
         
+    Returns:
+        dict: Final result, as from handle_casual_chat
+    """
+    parts = []
+    try:
+        response = generate_with_retry(
+            model, create_casual_prompt(query), CASUAL_CHAT_CONFIG, rate_limit, stream=True
+        )
+        for chunk in response:
+            text = chunk.text if parts else chunk.text.lstrip()
+            if text:
+                parts.append(text)
+                yield text
+    except Exception as e:
+        # Fall back to the canned reply unless part of an answer was already sent
+        if not parts:
+            yield CASUAL_CHAT_FALLBACK
         return {
-            "answer": f"Sorry, I encountered an error: {error_msg}",
-            "success": False,
-            "error": error_msg,
-            "leads_analyzed": len(leads_data) if leads_data else 0
+            "answer": CASUAL_CHAT_FALLBACK,
+            "success": True,
+            "error": None,
+            "leads_analyzed": 0
         }
+    
+    return {
+        "answer": "".join(parts).strip(),
+        "success": True,
+        "error": None,
+        "leads_analyzed": 0  # Not a lead query
+    }
+
+
+def chat_with_leads_stream(model, query: str, leads_data: list, cache_key: tuple = None, embedding=None,
+                           rate_limit=None) -> Iterator[str]:
+    """
+    Answer a chat query as a stream of text chunks.
+    
+    Lead questions and casual chat stream Gemini's tokens as they arrive, so
+    the first words show up after one network hop instead of after the full
+    generation. Cached answers and the "no leads" reply come as a single
+    chunk. Answers are cached the same way as in chat_with_leads, except
+    streamed lead answers that /chat would have cleaned up differently.
+    
+    Args:
+        model: Initialized Gemini model
+        query: User's question
+        leads_data: List of scored leads
+        cache_key: Precomputed chat_cache_key(query, leads_data), if available
+        embedding: Query embedding from an earlier lookup_chat_answer miss;
+            if given, the cache lookup is skipped
+        rate_limit: Optional blocking callable(estimated_tokens) run before
+            every Gemini call (see generate_with_retry)
+        
+    Yields:
+        str: Answer text chunks; joined they form the full answer
+        
+    Returns:
+        dict: Final result, as from chat_with_leads. When it is unsuccessful
+        its answer (the error message) was not yielded, and any text already
+        yielded is an incomplete answer.
+    """
+    if cache_key is None:
+        cache_key = chat_cache_key(query, leads_data)
+    
+    is_casual = not is_lead_related_question(query)
+    if not is_casual and not leads_data:
+        result = chat_with_leads(model, query, leads_data, cache_key)
+        yield result["answer"]
+        return result
+    
+    if embedding is None:
+        cached, embedding = lookup_chat_answer(query, leads_data, cache_key)
+        if cached is not None:
+            yield cached["answer"]
+            return cached
+    
+    if is_casual:
+        result = yield from stream_casual_answer(model, query, rate_limit)
+        cacheable = True
+    else:
+        result, cacheable = yield from stream_lead_answer(
+            model, query, leads_data, cache_key[1], rate_limit
+        )
+    if cacheable:
+        cache_chat_result(cache_key, leads_data, result, is_casual, embedding)
+    return result
+
+
+# Suggestions offered before any leads are loaded
+EMPTY_SUGGESTED_QUESTIONS = (
+    "How do I get started?",
+    "What can you help me with?"
+)
+
+# Suggestions offered for any non-empty lead set
+BASE_SUGGESTED_QUESTIONS = (
+    "Who are the top 5 leads I should contact?",
+    "Show me all high priority leads",
+    "What patterns do you see in high-scoring leads?",
+    "Which companies have urgent needs?",
+    "Who has budget approval?",
+    "What industries are represented in top leads?",
+    "Compare high vs medium priority leads",
+    "Give me contact details for top 3 leads"
+)
 
 
 def get_suggested_questions(leads_data: list) -> list:
@@ -597,25 +1357,11 @@ def get_suggested_questions(leads_data: list) -> list:
         list: Suggested questions
     """
     if not leads_data:
-        return [
-            "How do I get started?",
-            "What can you help me with?"
-        ]
-    
-    high_priority = len([l for l in leads_data if l.get('score', 0) >= 80])
+        return list(EMPTY_SUGGESTED_QUESTIONS)
     
-    suggestions = [
-        "Who are the top 5 leads I should contact?",
-        "Show me all high priority leads",
-        "What patterns do you see in high-scoring leads?",
-        "Which companies have urgent needs?",
-        "Who has budget approval?",
-        "What industries are represented in top leads?",
-        "Compare high vs medium priority leads",
-        "Give me contact details for top 3 leads"
-    ]
+    high_priority, _, _ = count_leads_by_priority(lead_scores_array(leads_data))
     
     if high_priority > 0:
-        suggestions.insert(0, f"Tell me about the {high_priority} high priority leads")
+        return [f"Tell me about the {high_priority} high priority leads", *BASE_SUGGESTED_QUESTIONS[:7]]
     
-    return suggestions[:8]
+    return list(BASE_SUGGESTED_QUESTIONS)
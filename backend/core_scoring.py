@@ -6,9 +6,10 @@ Hybrid: NLP scoring + LLM characterization
 import json
 import time
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
 import google.generativeai as genai
-from nlp_scorer import calculate_nlp_score, get_priority_label
+from nlp_scorer import calculate_nlp_score, get_priority_label as nlp_priority_label
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +18,10 @@ load_dotenv()
 # GEMINI CONFIGURATION
 # =============================================================================
 
+# SDK transport: "grpc" keeps a single long-lived HTTP/2 channel per process
+# that multiplexes all concurrent calls, so no TLS handshake is paid per call
+GEMINI_TRANSPORT = os.environ.get("GEMINI_TRANSPORT", "grpc")
+
 def initialize_gemini():
     """Initialize and configure Gemini API client."""
     api_key = os.environ.get("GEMINI_API_KEY")
@@ -27,7 +32,7 @@ def initialize_gemini():
             "Get your API key from: https://makersuite.google.com/app/apikey"
         )
     
-    genai.configure(api_key=api_key)
+    genai.configure(api_key=api_key, transport=GEMINI_TRANSPORT)
     
     generation_config = genai.GenerationConfig(
         response_mime_type="application/json",
@@ -49,30 +54,33 @@ def initialize_gemini():
 # INSTRUCTION PROMPT
 # =============================================================================
 
+# Static instructions come first and lead fields last, so the prompt prefix is
+# identical across leads and can be served from Gemini's prompt cache
 CHARACTERIZATION_PROMPT = """You are an expert B2B SaaS Sales Development Representative (SDR).
 
-A lead has been analyzed and given a score of {score}/100.
-
-Based on the lead information and score, provide a brief, actionable justification (max 15 words) explaining WHY this score was assigned.
-
-Lead Information:
-- Role: {role}
-- Company Size: {company_size}
-- Message: {message}
-- Score: {score}/100
+A lead has been analyzed and given a score. Based on the lead information and score, provide a brief, actionable justification (max 15 words) explaining WHY this score was assigned.
 
 Focus on the key factors that influenced the score (urgency, budget, authority, scale, company fit).
 
 You MUST return ONLY a JSON object:
 {{"justification": "<string max 15 words>"}}
 
-Be concise and specific. No other text or markdown."""
+Be concise and specific. No other text or markdown.
+
+Lead Information:
+- Role: {role}
+- Company Size: {company_size}
+- Message: {message}
+- Score: {score}/100"""
 
 
 # =============================================================================
 # SCORING FUNCTIONS
 # =============================================================================
 
+# Maximum number of unique leads kept in the in-process score cache
+SCORE_CACHE_SIZE = 10_000
+
 def format_lead_data(role, company_size, message):
     """
     Format lead data into a string for the AI prompt.
@@ -88,6 +96,55 @@ def format_lead_data(role, company_size, message):
     return f"Role: {role}, Company Size: {company_size}, Message: '{message}'"
 
 
+def canonicalize_lead_text(text):
+    """
+    Canonical form of free-text lead fields used as the score cache key.
+    
+    The NLP scorer lowercases role and message before matching and is
+    insensitive to surrounding whitespace, so leads that only differ in
+    case or padding always get the same score and can share a cache entry.
+    
+    Args:
+        text (str): Role or message text
+        
+    Returns:
+        str: Stripped, lowercased text
+    """
+    return text.strip().lower()
+
+
+@lru_cache(maxsize=SCORE_CACHE_SIZE)
+def _score_lead_cached(role, company_size, message):
+    """
+    Score a lead once per unique (role, company_size, message) and memoize it.
+    
+    Scoring is deterministic, so repeated leads (duplicate CSV rows, form
+    templates, re-submitted batches) are served straight from memory.
+    
+    Returns:
+        tuple: (score, justification)
+    """
+    nlp_result = calculate_nlp_score(role, company_size, message)
+    score = nlp_result['score']
+    return score, generate_fallback_justification(score, nlp_result['signals'])
+
+
+def get_score_cache_stats():
+    """
+    Get hit/miss statistics for the in-process score cache.
+    
+    Returns:
+        dict: {"hits": int, "misses": int, "size": int, "max_size": int}
+    """
+    info = _score_lead_cached.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize
+    }
+
+
 def score_single_lead(model, role, company_size, message, retries=2):
     """
     Score a single lead using PURE NLP approach:
@@ -95,6 +152,8 @@ def score_single_lead(model, role, company_size, message, retries=2):
     2. Generate justification using NLP (instant, no API call)
     
     ZERO LLM API CALLS = INSTANT RESULTS!
+    Identical leads (ignoring case and surrounding whitespace) are served
+    from an in-process LRU cache.
     
     Args:
         model: Initialized Gemini model (kept for compatibility, not used)
@@ -107,13 +166,12 @@ def score_single_lead(model, role, company_size, message, retries=2):
         dict: {"score": int, "justification": str, "success": bool, "error": str or None}
     """
     try:
-        # Calculate score and justification using NLP ONLY (instant!)
-        nlp_result = calculate_nlp_score(role, company_size, message)
-        score = nlp_result['score']
-        signals = nlp_result['signals']
-        
-        # Generate justification using NLP (no LLM call!)
-        justification = generate_fallback_justification(score, signals)
+        # Calculate score and justification using NLP ONLY (cached, instant!)
+        score, justification = _score_lead_cached(
+            canonicalize_lead_text(role),
+            company_size,
+            canonicalize_lead_text(message)
+        )
         
         return {
             "score": score,
@@ -179,6 +237,10 @@ def generate_fallback_justification(score: int, signals: dict) -> str:
         return "Poor fit or spam indicators"
 
 
+# Priority label for every possible score, built once at import
+PRIORITY_LABELS = tuple(nlp_priority_label(score) for score in range(101))
+
+
 def get_priority_label(score):
     """
     Get priority label based on score.
@@ -189,14 +251,7 @@ def get_priority_label(score):
     Returns:
         str: Priority label
     """
-    if score >= 80:
-        return "🔥 High Priority"
-    elif score >= 40:
-        return "⚠️ Medium Priority"
-    elif score >= 1:
-        return "❄️ Low Priority"
-    else:
-        return "🚫 Junk/Error"
+    return PRIORITY_LABELS[max(0, min(100, int(score)))]
 
 
 def get_priority_color(score):
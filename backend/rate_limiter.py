@@ -0,0 +1,74 @@
+"""
+Rate Limiter for Gemini API Calls
+Token bucket that enforces both requests-per-minute and tokens-per-minute quotas
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Dual token bucket gating LLM calls on RPM and TPM.
+
+    Both buckets refill continuously at their per-minute rate and hold at most
+    one minute of budget, so short bursts go through immediately while the
+    sustained rate never exceeds the quota. Waiters are served in FIFO order.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        """
+        Args:
+            rpm: Allowed requests per minute
+            tpm: Allowed tokens per minute
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_tokens = float(rpm)
+        self.token_tokens = float(tpm)
+        self.last_update = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Add the budget accrued since the last update, capped at one minute."""
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.last_update = now
+        self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60)
+        self.token_tokens = min(self.tpm, self.token_tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, estimated_tokens: int = 0):
+        """
+        Wait until one request and `estimated_tokens` tokens are available, then consume them.
+
+        Args:
+            estimated_tokens: Expected prompt + output tokens for the call
+        """
+        # A single call can never need more than a full minute of budget
+        estimated_tokens = min(estimated_tokens, self.tpm)
+
+        async with self._lock:
+            while True:
+                self._refill()
+
+                if self.request_tokens >= 1 and self.token_tokens >= estimated_tokens:
+                    self.request_tokens -= 1
+                    self.token_tokens -= estimated_tokens
+                    return
+
+                # Sleep just long enough for the scarcer bucket to refill
+                wait_s = max(
+                    (1 - self.request_tokens) * 60 / self.rpm,
+                    (estimated_tokens - self.token_tokens) * 60 / self.tpm
+                )
+                await asyncio.sleep(wait_s)
+
+    def acquire_threadsafe(self, loop, estimated_tokens: int = 0):
+        """
+        Blocking acquire() for worker threads, run on the event loop that owns the bucket.
+
+        Args:
+            loop: Event loop the bucket is used from
+            estimated_tokens: Expected prompt + output tokens for the call
+        """
+        asyncio.run_coroutine_threadsafe(self.acquire(estimated_tokens), loop).result()
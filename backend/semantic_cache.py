@@ -0,0 +1,164 @@
+"""
+Semantic Cache for Chat Answers
+Reuses answers to near-duplicate lead questions using sentence embeddings
+"""
+
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Small, fast sentence embedding model (384 dimensions)
+SEMANTIC_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Cosine similarity above which two questions count as the same question
+SEMANTIC_SIMILARITY_THRESHOLD = 0.92
+
+# Total cached questions across all lead sets; oldest evicted first
+SEMANTIC_CACHE_SIZE = 1024
+
+# Seconds a cached answer stays reusable; matches the exact chat cache TTL
+SEMANTIC_CACHE_TTL_S = 600
+
+# "top 5 leads" and "top 3 leads" embed almost identically, so numbers must match too
+NUMBER_RE = re.compile(r'\d+')
+
+
+class SemanticCache:
+    """
+    Embedding cache of chat answers, bucketed by the caller's key.
+
+    Questions are embedded with a sentence-transformers model (loaded on first
+    use) and compared by cosine similarity against earlier questions in the
+    same bucket, so an answer never leaks across different lead data or
+    question intents. Entries expire after `ttl_s` seconds. If the model can't
+    be loaded, the cache disables itself and every lookup misses.
+    """
+
+    def __init__(
+        self,
+        model_name: str = SEMANTIC_MODEL_NAME,
+        threshold: float = SEMANTIC_SIMILARITY_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_SIZE,
+        ttl_s: float = SEMANTIC_CACHE_TTL_S
+    ):
+        """
+        Args:
+            model_name: sentence-transformers model used to embed questions
+            threshold: Minimum cosine similarity for a cache hit
+            max_entries: Maximum cached questions before FIFO eviction
+            ttl_s: Seconds before a cached answer expires
+        """
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._encoder = None
+        self._encoder_failed = False
+        self._encoder_lock = threading.Lock()
+        # bucket key -> {"embeddings": (n, dim) array, "queries": [...],
+        #                "results": [...], "stored_at": [...]}
+        self._buckets = {}
+        self._order = deque()  # bucket key of every entry, oldest first
+        self._lock = threading.Lock()
+
+    def _get_encoder(self):
+        """Load the embedding model on first use; None if it is unavailable."""
+        if self._encoder is None and not self._encoder_failed:
+            with self._encoder_lock:
+                if self._encoder is None and not self._encoder_failed:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                        self._encoder = SentenceTransformer(self.model_name)
+                    except Exception as e:
+                        self._encoder_failed = True
+                        print(f"⚠️  Semantic chat cache disabled: {e}")
+        return self._encoder
+
+    def _evict_oldest(self):
+        """Drop the oldest entry. Caller holds self._lock."""
+        oldest_key = self._order.popleft()
+        oldest = self._buckets[oldest_key]
+        # Entries are appended in order, so a bucket's oldest is its first row
+        oldest["embeddings"] = oldest["embeddings"][1:]
+        del oldest["queries"][0]
+        del oldest["results"][0]
+        del oldest["stored_at"][0]
+        if not oldest["queries"]:
+            del self._buckets[oldest_key]
+
+    def _evict_expired(self):
+        """Drop entries past their TTL. Caller holds self._lock."""
+        # Every entry shares one TTL, so expired entries are always the oldest
+        deadline = time.monotonic() - self.ttl_s
+        while self._order and self._buckets[self._order[0]]["stored_at"][0] < deadline:
+            self._evict_oldest()
+
+    def lookup(self, query: str, bucket_key):
+        """
+        Find a cached answer to a near-identical question in the same bucket.
+
+        Args:
+            query: Normalized user question
+            bucket_key: Hashable key (lead data fingerprint, question intent)
+                that a reusable answer must share
+
+        Returns:
+            tuple: (cached result or None, query embedding or None, time the
+            result was stored or None). Pass the embedding to store() on a miss
+            to avoid embedding twice; the stored time is on the
+            time.monotonic() clock.
+        """
+        encoder = self._get_encoder()
+        if encoder is None:
+            return None, None, None
+
+        embedding = encoder.encode(query, normalize_embeddings=True)
+
+        with self._lock:
+            self._evict_expired()
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                return None, embedding, None
+
+            # Embeddings are L2-normalized, so the dot product is cosine similarity
+            similarities = bucket["embeddings"] @ embedding
+            best = int(np.argmax(similarities))
+            if (
+                similarities[best] >= self.threshold
+                and NUMBER_RE.findall(bucket["queries"][best]) == NUMBER_RE.findall(query)
+            ):
+                return dict(bucket["results"][best]), embedding, bucket["stored_at"][best]
+
+        return None, embedding, None
+
+    def store(self, query: str, bucket_key, embedding, result: dict):
+        """
+        Cache an answer, evicting the oldest entry when the cache is full.
+
+        Args:
+            query: Normalized user question
+            bucket_key: Bucket key the question was looked up under
+            embedding: Query embedding returned by lookup()
+            result: Chat result to reuse
+        """
+        with self._lock:
+            self._evict_expired()
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self._buckets[bucket_key] = {
+                    "embeddings": np.empty((0, len(embedding)), dtype=np.float32),
+                    "queries": [],
+                    "results": [],
+                    "stored_at": []
+                }
+            bucket["embeddings"] = np.vstack([bucket["embeddings"], embedding])
+            bucket["queries"].append(query)
+            bucket["results"].append(dict(result))
+            bucket["stored_at"].append(time.monotonic())
+            self._order.append(bucket_key)
+
+            while len(self._order) > self.max_entries:
+                self._evict_oldest()
@@ -0,0 +1,95 @@
+"""
+Tests for the chat answer caches
+Run from backend/: python -m pytest -q
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import chat_agent
+from semantic_cache import SemanticCache
+
+LEADS = [
+    {"full_name": "John Smith", "company_name": "Acme Corp", "score": 92, "email": "john@acme.com"},
+    {"full_name": "Jane Smith", "company_name": "Acme Inc", "score": 45, "email": "jane@acmeinc.com"},
+]
+
+
+class IdenticalEncoder:
+    """Embeds every question the same, the worst case for near-duplicate matching."""
+
+    def encode(self, query, normalize_embeddings=True):
+        return np.full(4, 0.5, dtype=np.float32)
+
+
+@pytest.fixture
+def chat_caches(monkeypatch):
+    """Empty exact and semantic chat caches, with a stand-in embedding model."""
+    semantic_cache = SemanticCache()
+    semantic_cache._encoder = IdenticalEncoder()
+    monkeypatch.setattr(chat_agent, "semantic_chat_cache", semantic_cache)
+    monkeypatch.setattr(chat_agent, "chat_answer_cache", OrderedDict())
+
+
+def answer_and_cache(query, answer):
+    """Miss the caches for `query`, then cache `answer` as its chat result."""
+    cache_key = chat_agent.chat_cache_key(query, LEADS)
+    cached, embedding = chat_agent.lookup_chat_answer(query, LEADS, cache_key)
+    assert cached is None
+    result = {"answer": answer, "success": True, "error": None, "leads_analyzed": len(LEADS)}
+    chat_agent.cache_chat_result(cache_key, LEADS, result, False, embedding)
+
+
+def lookup(query):
+    cache_key = chat_agent.chat_cache_key(query, LEADS)
+    cached, _ = chat_agent.lookup_chat_answer(query, LEADS, cache_key)
+    return cached
+
+
+def test_rephrased_question_reuses_answer(chat_caches):
+    answer_and_cache("what is John Smith's email", "john@acme.com")
+
+    assert lookup("what's the email of John Smith?")["answer"] == "john@acme.com"
+
+
+@pytest.mark.parametrize("first, second", [
+    ("what is John Smith's email", "what is Jane Smith's email"),
+    ("tell me about Acme Corp", "tell me about Acme Inc"),
+])
+def test_questions_about_different_leads_do_not_share_answers(chat_caches, first, second):
+    answer_and_cache(first, "answer about the first lead")
+
+    assert lookup(second) is None
+    # The miss must not have planted the first answer in the exact cache either
+    assert lookup(second) is None
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StreamingModel:
+    """Gemini stand-in that streams a fixed answer in two chunks."""
+
+    def __init__(self, answer):
+        self.answer = answer
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        half = len(self.answer) // 2
+        return iter([Chunk(self.answer[:half]), Chunk(self.answer[half:])])
+
+
+@pytest.mark.parametrize("answer, cached", [
+    ("Reach out to John Smith first, he scored 92.", True),
+    # /chat would rewrite the quoted values, so the streamed text must not be cached
+    ('Top leads: "John Smith", "Acme Corp", "CEO"', False),
+])
+def test_streamed_answer_cached_only_if_chat_would_match(chat_caches, answer, cached):
+    query = "who is the best lead to call"
+    streamed = "".join(chat_agent.chat_with_leads_stream(StreamingModel(answer), query, LEADS))
+
+    assert streamed == answer
+    assert (lookup(query) is not None) == cached
@@ -8,6 +8,9 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
+import html
+import io
+import orjson
 import requests
 import time
 import math
@@ -17,45 +20,41 @@ import numpy as np
 # UTILITY FUNCTIONS
 # =============================================================================
 
+# String forms of missing/invalid values (compared lower-cased)
+NAN_SENTINELS = frozenset({'nan', 'none', 'nat', 'inf', '-inf'})
+
+
+def clean_json_value(value):
+    """Replace a missing/invalid value (None, NaN, infinity, "nan", ...) with 'N/A'."""
+    # Handle None
+    if value is None:
+        return 'N/A'
+    
+    # Strings: only the sentinel spellings are missing values
+    if isinstance(value, str):
+        return 'N/A' if value.lower() in NAN_SENTINELS else value
+    
+    # Handle NaN and infinity (Python and numpy floats)
+    if isinstance(value, (float, np.floating)):
+        return value if math.isfinite(value) else 'N/A'
+    
+    # Integers and bools are always valid
+    if isinstance(value, (int, np.integer)):
+        return value
+    
+    # Anything else (pandas NaT, Decimal, ...) by its string form
+    return 'N/A' if str(value).lower() in NAN_SENTINELS else value
+
+
 def clean_lead_data_for_json(leads_data):
     """
     Clean lead data to ensure all values are JSON-serializable.
     Removes NaN, None, and infinity values.
     """
-    cleaned_leads = []
-    
-    for lead in leads_data:
-        cleaned_lead = {}
-        for key, value in lead.items():
-            # Handle None
-            if value is None:
-                cleaned_lead[key] = 'N/A'
-                continue
-            
-            # Handle NaN and infinity for floats
-            if isinstance(value, float):
-                if math.isnan(value) or math.isinf(value):
-                    cleaned_lead[key] = 'N/A'
-                    continue
-            
-            # Handle numpy types
-            try:
-                if np.isnan(value):
-                    cleaned_lead[key] = 'N/A'
-                    continue
-            except (TypeError, ValueError):
-                pass
-            
-            # Convert to string and check
-            str_value = str(value)
-            if str_value.lower() in ['nan', 'none', 'nat', 'inf', '-inf']:
-                cleaned_lead[key] = 'N/A'
-            else:
-                cleaned_lead[key] = value
-        
-        cleaned_leads.append(cleaned_lead)
-    
-    return cleaned_leads
+    return [
+        {key: clean_json_value(value) for key, value in lead.items()}
+        for lead in leads_data
+    ]
 
 
 # =============================================================================
@@ -65,6 +64,21 @@ def clean_lead_data_for_json(leads_data):
 # Backend API URL
 BACKEND_URL = "http://localhost:8000"
 
+# Minimum seconds between batch progress bar updates while results stream in;
+# every update is a websocket message to the browser
+BATCH_PROGRESS_INTERVAL = 0.25
+
+# Seconds a backend health check is reused across reruns
+HEALTH_CHECK_TTL = 10
+
+# Lead fields the backend chat agent reads (chat_agent.CHAT_FINGERPRINT_FIELDS);
+# everything else, like the full message text, is left out of /chat requests
+CHAT_LEAD_FIELDS = ('full_name', 'company_name', 'role', 'score', 'email', 'justification')
+
+# Precedes the error message when /chat/stream fails mid-answer
+# (api.CHAT_STREAM_ERROR_MARKER)
+CHAT_STREAM_ERROR_MARKER = "\x1e"
+
 # =============================================================================
 # PAGE CONFIGURATION
 # =============================================================================
@@ -90,12 +104,58 @@ if 'backend_status' not in st.session_state:
 # API COMMUNICATION FUNCTIONS
 # =============================================================================
 
+@st.cache_resource
+def get_http_session():
+    """
+    Shared HTTP session for all backend calls.
+    
+    Streamlit re-runs the script on every interaction; keeping one session
+    alive across reruns reuses its pooled keep-alive connections instead of
+    opening a new TCP connection per request.
+    """
+    return requests.Session()
+
+
+# Content type for orjson-encoded request bodies
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def post_json(path, payload, **kwargs):
+    """
+    POST a JSON body to the backend over the shared session.
+    
+    The body is encoded with orjson instead of the stdlib json that
+    requests uses for json=; lead lists for batch scoring and chat run to
+    megabytes.
+    
+    Args:
+        path (str): Backend endpoint path, e.g. "/score"
+        payload: JSON-serializable request body (numpy scalars allowed)
+        **kwargs: Passed through to requests (timeout, stream, ...)
+        
+    Returns:
+        requests.Response
+    """
+    return get_http_session().post(
+        f"{BACKEND_URL}{path}",
+        data=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+        headers=JSON_HEADERS,
+        **kwargs
+    )
+
+
+@st.cache_data(ttl=HEALTH_CHECK_TTL, show_spinner=False)
 def check_backend_health():
-    """Check if backend API is running and healthy."""
+    """
+    Check if backend API is running and healthy.
+    
+    Cached for HEALTH_CHECK_TTL seconds, so widget interactions (each one
+    a full script rerun) don't wait on a backend round trip.
+    """
     try:
-        response = requests.get(f"{BACKEND_URL}/health", timeout=5)
+        response = get_http_session().get(f"{BACKEND_URL}/health", timeout=5)
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             return {
                 "status": "healthy",
                 "gemini_initialized": data.get("gemini_initialized", False)
@@ -114,9 +174,9 @@ def score_lead_api(role, company_size, message):
     Flow: Frontend (this) → Backend API → NLP Scorer → Backend → Frontend
     """
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/score",
-            json={
+        response = post_json(
+            "/score",
+            {
                 "role": role,
                 "company_size": company_size,
                 "message": message
@@ -125,7 +185,7 @@ def score_lead_api(role, company_size, message):
         )
         
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         else:
             return {
                 "score": 0,
@@ -152,28 +212,115 @@ def score_lead_api(role, company_size, message):
         }
 
 
-def score_batch_api(leads):
+# Result for a lead the batch stream ended before reaching
+NOT_PROCESSED_RESULT = {
+    "score": 0,
+    "justification": "Not processed",
+    "priority_label": "🚫 Junk/Error",
+    "success": False,
+    "error": "Not processed"
+}
+
+
+def score_batch_api(leads, on_progress=None):
     """
     Send multiple leads to backend API for batch scoring.
     
+    Each distinct (role, company_size, message) is sent once and its result
+    is fanned back out to every duplicate. Results are streamed back one
+    NDJSON line per lead, so progress can be reported while the rest of the
+    batch is still being scored.
+    
     Flow: Frontend (this) → Backend API → NLP Scorer (batch) → Backend → Frontend
+    
+    Args:
+        leads (list): Lead dicts with role, company_size and message
+        on_progress (callable): Optional callback(done, total) over the distinct
+            leads, called at most every BATCH_PROGRESS_INTERVAL seconds and
+            once at the end
+        
+    Returns:
+        dict: {"results": [...], "successful": int, "failed": int}, one result
+        per input lead in order, or None on error
     """
+    # Position of each lead's (role, company_size, message) among the distinct ones
+    unique_positions = {}
+    lead_positions = [
+        unique_positions.setdefault(
+            (lead["role"], lead["company_size"], lead["message"]), len(unique_positions)
+        )
+        for lead in leads
+    ]
+    unique_leads = [
+        {"role": role, "company_size": company_size, "message": message}
+        for role, company_size, message in unique_positions
+    ]
+    
     try:
-        response = requests.post(
-            f"{BACKEND_URL}/score/batch",
-            json={"leads": leads},
+        with post_json(
+            "/score/batch/stream",
+            {"leads": unique_leads},
+            stream=True,
             timeout=120  # 2 minutes max (100 concurrent workers)
-        )
+        ) as response:
+            if response.status_code != 200:
+                return None
+            
+            unique_results = []
+            last_progress = time.monotonic()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                unique_results.append(orjson.loads(line))
+                if on_progress and time.monotonic() - last_progress >= BATCH_PROGRESS_INTERVAL:
+                    on_progress(len(unique_results), len(unique_leads))
+                    last_progress = time.monotonic()
         
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return None
+        if on_progress and unique_results:
+            on_progress(len(unique_results), len(unique_leads))
+        
+        results = [
+            unique_results[position] if position < len(unique_results) else NOT_PROCESSED_RESULT
+            for position in lead_positions
+        ]
+        successful = sum(1 for result in results if result.get("success"))
+        return {
+            "results": results,
+            "successful": successful,
+            "failed": len(results) - successful
+        }
     except Exception as e:
         st.error(f"Batch scoring failed: {e}")
         return None
 
 
+def iter_chat_answer(response, stream_errors):
+    """
+    Yield the answer text of a /chat/stream response as it arrives.
+    
+    Args:
+        response: Streaming 200 response from /chat/stream
+        stream_errors (list): Receives the backend's error message if the
+            answer broke off partway; the text yielded before it is incomplete
+        
+    Yields:
+        str: Answer text chunks
+    """
+    error_parts = None
+    for text in response.iter_content(chunk_size=None, decode_unicode=True):
+        if error_parts is not None:
+            error_parts.append(text)
+            continue
+        text, marker, error = text.partition(CHAT_STREAM_ERROR_MARKER)
+        if text:
+            yield text
+        if marker:
+            error_parts = [error]
+    
+    if error_parts is not None:
+        stream_errors.append("".join(error_parts))
+
+
 # =============================================================================
 # UTILITY FUNCTIONS
 # =============================================================================
@@ -249,6 +396,95 @@ def get_priority_color(priority_label):
         return "gray"
 
 
+# Optional contact fields shown on a lead card, with their labels
+LEAD_CARD_CONTACT_FIELDS = (
+    ('full_name', '👤 Name'),
+    ('email', '📧 Email'),
+    ('company_name', '🏢 Company'),
+)
+
+
+def escape_card_text(value):
+    """HTML-escape a lead field for a card, keeping line breaks as <br>."""
+    return html.escape(str(value)).replace("\n", "<br>")
+
+
+def build_lead_card_html(rank, lead):
+    """
+    Build the HTML card for one Top-10 lead.
+    
+    Lead fields come from the uploaded CSV and are escaped with escape_card_text.
+    
+    Args:
+        rank (int): 1-based position in the Top-10 list
+        lead (dict): Scored lead record
+        
+    Returns:
+        str: Self-contained <div> card
+    """
+    score = lead['score']
+    if score >= 80:
+        card_color, border_color, icon = "#ffebee", "#d32f2f", "🔥"  # Light red
+    elif score >= 40:
+        card_color, border_color, icon = "#fff3e0", "#f57c00", "⚠️"  # Light orange
+    else:
+        card_color, border_color, icon = "#e3f2fd", "#1976d2", "❄️"  # Light blue
+    
+    details = [
+        f"<b>{label}:</b> {escape_card_text(lead[key])}"
+        for key, label in LEAD_CARD_CONTACT_FIELDS
+        if key in lead and pd.notna(lead[key])
+    ]
+    details.append(f"<b>💼 Role:</b> {escape_card_text(lead['role'])}")
+    details.append(f"<b>📊 Company Size:</b> {escape_card_text(lead['company_size'])}")
+    details.append(f"<b>Priority:</b> {escape_card_text(lead['priority_label'])}")
+    
+    # No blank lines or indentation: markdown would end the HTML block or render a code block
+    return (
+        f'<div style="background-color: {card_color}; padding: 20px; border-radius: 10px; '
+        f'margin-bottom: 15px; border-left: 5px solid {border_color}; color: #333;">'
+        f'<h3 style="margin: 0; color: #333;">{icon} #{rank} - Score: {score}/100</h3>'
+        f'<p style="margin: 10px 0;">{"<br>".join(details)}</p>'
+        f'<p style="margin: 10px 0;"><b>💬 Message:</b><br>{escape_card_text(lead["message"])}</p>'
+        f'<p style="margin: 0;"><b>🎯 AI Justification:</b> {escape_card_text(lead["justification"])}</p>'
+        f'</div>'
+    )
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def leads_to_csv_bytes(df):
+    """
+    Serialize scored leads for the download buttons.
+    
+    Cached on the DataFrame's contents, so reruns that don't change the
+    leads (any widget interaction) reuse the encoded CSV. pandas writes
+    straight into a bytes buffer, without building the whole CSV as a str
+    and encoding a second copy.
+    """
+    buffer = io.BytesIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def count_priority_leads(scores):
+    """
+    Count high (80+) and medium (40-79) priority leads in one vectorized pass.
+    
+    Args:
+        scores: Sequence or array of lead scores; missing or non-numeric
+            scores ('N/A', NaN) count as neither
+        
+    Returns:
+        tuple: (high_count, medium_count)
+    """
+    scores = np.asarray(pd.to_numeric(scores, errors='coerce'), dtype=float)
+    # searchsorted would put NaN past every edge, i.e. in the high bin
+    scores = scores[np.isfinite(scores)]
+    buckets = np.searchsorted([40, 80], scores, side='right')
+    counts = np.bincount(buckets, minlength=3)
+    return int(counts[2]), int(counts[1])
+
+
 # =============================================================================
 # MAIN APP
 # =============================================================================
@@ -290,6 +526,10 @@ def main():
         else:
             st.error(f"❌ Backend API: {status['status']}")
         
+        if st.button("🔄 Refresh Status", use_container_width=True):
+            check_backend_health.clear()
+            st.rerun()
+        
         st.divider()
         
         # Architecture Info
@@ -476,42 +716,43 @@ def show_batch_processing_page():
                 status_text = st.empty()
                 
                 total_leads = len(df)
-                start_time = time.time()
+                start_time = time.monotonic()
                 
                 status_text.text(f"⚡ Processing {total_leads} leads in parallel (100 concurrent workers)...")
-                progress_bar.progress(0.5)
                 
-                # Prepare leads for batch API
-                leads_list = []
-                for _, row in df.iterrows():
-                    leads_list.append({
-                        "role": str(row['role']),
-                        "company_size": str(row['company_size']),
-                        "message": str(row['message'])
-                    })
+                # Prepare leads for batch API (column-wise; iterrows boxes every row into a Series)
+                leads_list = [
+                    {
+                        "role": str(role),
+                        "company_size": str(company_size),
+                        "message": str(message)
+                    }
+                    for role, company_size, message in zip(df['role'], df['company_size'], df['message'])
+                ]
                 
                 # Clean the data for JSON serialization
                 leads_list = clean_lead_data_for_json(leads_list)
                 
                 # Send all leads in ONE batch request (backend processes 10 at a time)
                 try:
-                    batch_result = score_batch_api(leads_list)
+                    batch_result = score_batch_api(
+                        leads_list,
+                        on_progress=lambda done, total: progress_bar.progress(
+                            done / total, text=f"Scored {done}/{total} unique leads"
+                        )
+                    )
                     
                     if batch_result:
-                        # Merge results with original data
-                        results = []
-                        for idx, (_, row) in enumerate(df.iterrows()):
-                            result_dict = row.to_dict()
-                            if idx < len(batch_result['results']):
-                                score_data = batch_result['results'][idx]
-                                result_dict['score'] = score_data['score']
-                                result_dict['justification'] = score_data['justification']
-                                result_dict['priority_label'] = score_data['priority_label']
-                            else:
-                                result_dict['score'] = 0
-                                result_dict['justification'] = 'Not processed'
-                                result_dict['priority_label'] = '🚫 Junk/Error'
-                            results.append(result_dict)
+                        # Merge results with original data as whole columns;
+                        # leads the backend did not return are marked unprocessed
+                        scored = batch_result['results'][:total_leads]
+                        missing = total_leads - len(scored)
+                        results_df = df.assign(
+                            score=[r['score'] for r in scored] + [0] * missing,
+                            justification=[r['justification'] for r in scored] + ['Not processed'] * missing,
+                            priority_label=[r['priority_label'] for r in scored] + ['🚫 Junk/Error'] * missing
+                        )
+                        results = results_df.to_dict('records')
                         
                         successful = batch_result['successful']
                         failed = batch_result['failed']
@@ -528,13 +769,12 @@ def show_batch_processing_page():
                     failed = total_leads
                 
                 # Complete
-                total_time = time.time() - start_time
+                total_time = time.monotonic() - start_time
                 
                 if total_time < 60:
                     time_str = f"{total_time:.1f}s"
                 else:
-                    minutes = int(total_time / 60)
-                    seconds = int(total_time % 60)
+                    minutes, seconds = divmod(int(total_time), 60)
                     time_str = f"{minutes}m {seconds}s"
                 
                 status_text.text(f"✅ Processing complete in {time_str}!")
@@ -542,14 +782,14 @@ def show_batch_processing_page():
                 
                 if results:
                     
-                    # Create results DataFrame
-                    results_df = pd.DataFrame(results)
+                    # Highest scores first
                     results_df = results_df.sort_values('score', ascending=False).reset_index(drop=True)
                     
-                    # Store in session state
+                    # Store in session state; the whole batch shares one timestamp
+                    batch_timestamp = datetime.now().isoformat()
                     for result in results:
-                        result['timestamp'] = datetime.now().isoformat()
-                        st.session_state.scored_leads.append(result)
+                        result['timestamp'] = batch_timestamp
+                    st.session_state.scored_leads.extend(results)
                     
                     # Display results
                     st.divider()
@@ -574,51 +814,14 @@ def show_batch_processing_page():
                     
                     top_10 = results_df.head(10)
                     
-                    for idx, lead in top_10.iterrows():
-                        # Determine color based on score
-                        if lead['score'] >= 80:
-                            card_color = "#ffebee"  # Light red
-                            icon = "🔥"
-                        elif lead['score'] >= 40:
-                            card_color = "#fff3e0"  # Light orange
-                            icon = "⚠️"
-                        else:
-                            card_color = "#e3f2fd"  # Light blue
-                            icon = "❄️"
-                        
-                        with st.container():
-                            st.markdown(f"""
-                            <div style="background-color: {card_color}; padding: 20px; border-radius: 10px; margin-bottom: 15px; border-left: 5px solid {'#d32f2f' if lead['score'] >= 80 else '#f57c00' if lead['score'] >= 40 else '#1976d2'};">
-                                <h3 style="margin: 0; color: #333;">{icon} #{idx+1} - Score: {lead['score']}/100</h3>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            col1, col2 = st.columns([2, 1])
-                            
-                            with col1:
-                                # Display name and company if available
-                                if 'full_name' in lead and pd.notna(lead['full_name']):
-                                    st.markdown(f"**👤 Name:** {lead['full_name']}")
-                                
-                                if 'email' in lead and pd.notna(lead['email']):
-                                    st.markdown(f"**📧 Email:** {lead['email']}")
-                                
-                                if 'company_name' in lead and pd.notna(lead['company_name']):
-                                    st.markdown(f"**🏢 Company:** {lead['company_name']}")
-                                
-                                st.markdown(f"**💼 Role:** {lead['role']}")
-                                st.markdown(f"**📊 Company Size:** {lead['company_size']}")
-                                
-                            with col2:
-                                st.markdown(f"**Priority:** {lead['priority_label']}")
-                                st.metric("Score", f"{lead['score']}/100", delta=None)
-                            
-                            st.markdown(f"**💬 Message:**")
-                            st.info(lead['message'])
-                            
-                            st.markdown(f"**🎯 AI Justification:** {lead['justification']}")
-                            
-                            st.markdown("---")
+                    # All ten cards in one markdown element instead of ~12 elements per lead
+                    st.markdown(
+                        "\n".join(
+                            build_lead_card_html(rank, lead)
+                            for rank, lead in enumerate(top_10.to_dict('records'), start=1)
+                        ),
+                        unsafe_allow_html=True
+                    )
                     
                     st.divider()
                     
@@ -631,10 +834,9 @@ def show_batch_processing_page():
                         )
                     
                     # Download button
-                    csv = results_df.to_csv(index=False)
                     st.download_button(
                         label="📥 Download Complete Results (CSV)",
-                        data=csv,
+                        data=leads_to_csv_bytes(results_df),
                         file_name=f"scored_leads_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                         mime="text/csv",
                         use_container_width=True,
@@ -667,11 +869,10 @@ def show_analytics_page():
     
     with col1:
         st.metric("Total Leads", len(df))
+    high, medium = count_priority_leads(df['score'].to_numpy())
     with col2:
-        high = len(df[df['score'] >= 80])
         st.metric("🔥 High Priority", high)
     with col3:
-        medium = len(df[(df['score'] >= 40) & (df['score'] < 80)])
         st.metric("⚠️ Medium Priority", medium)
     with col4:
         avg_score = df['score'].mean()
@@ -701,10 +902,9 @@ def show_analytics_page():
     
     # Export all data
     st.divider()
-    csv = df.to_csv(index=False)
     st.download_button(
         label="📥 Download All Scored Leads",
-        data=csv,
+        data=leads_to_csv_bytes(df),
         file_name=f"all_scored_leads_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
         mime="text/csv"
     )
@@ -741,8 +941,9 @@ def show_chat_agent_page():
     
     # Display lead data summary
     total_leads = len(st.session_state.scored_leads)
-    high_priority = len([l for l in st.session_state.scored_leads if l.get('score', 0) >= 80])
-    medium_priority = len([l for l in st.session_state.scored_leads if 40 <= l.get('score', 0) < 80])
+    high_priority, medium_priority = count_priority_leads(
+        [lead.get('score', 0) for lead in st.session_state.scored_leads]
+    )
     
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -813,37 +1014,47 @@ def show_chat_agent_page():
     if send_button and user_query:
         with st.spinner("🤔 AI is thinking... (this may take 10-15 seconds)"):
             try:
-                # Clean lead data before sending (remove NaN values)
-                cleaned_leads = clean_lead_data_for_json(st.session_state.scored_leads)
+                # Send only the fields the chat agent reads, cleaned of NaN values
+                cleaned_leads = clean_lead_data_for_json(
+                    {field: lead[field] for field in CHAT_LEAD_FIELDS if field in lead}
+                    for lead in st.session_state.scored_leads
+                )
                 
-                # Send query to backend
-                response = requests.post(
-                    f"{BACKEND_URL}/chat",
-                    json={
+                # Send query to backend; the answer streams in as it is generated
+                response = post_json(
+                    "/chat/stream",
+                    {
                         "query": user_query,
                         "leads_data": cleaned_leads
                     },
+                    stream=True,
                     timeout=60  # Increased to 60 seconds for LLM response
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    response.encoding = "utf-8"
+                    stream_errors = []
+                    answer = st.write_stream(iter_chat_answer(response, stream_errors))
                     
-                    if result.get('success'):
+                    # A broken-off answer is shown but not kept in the history
+                    if stream_errors:
+                        st.error(f"❌ {stream_errors[0]}")
+                    else:
                         # Add to chat history
                         st.session_state.chat_history.append({
                             'question': user_query,
-                            'answer': result['answer'],
+                            'answer': answer,
                             'timestamp': datetime.now().strftime("%I:%M %p")
                         })
                         
                         # Clear input
                         st.session_state.chat_input = ''
                         st.rerun()
-                    else:
-                        st.error(f"❌ Error: {result.get('error', 'Unknown error')}")
                 elif response.status_code == 503:
                     st.error("❌ Gemini API not initialized. Please check your API key.")
+                elif response.status_code in (429, 502):
+                    # Gemini failed before answering (rate limit or API error)
+                    st.error(f"❌ {response.json()['detail']}")
                 else:
                     st.error(f"❌ Error {response.status_code}: {response.text}")
             